@@ -0,0 +1,108 @@
+"""Local stand-in for the OpenRouter chat completions API.
+
+Streams a canned completion as server-sent events at a configurable token
+rate, so that the app and the benchmarks run without network access:
+
+    python -m benchmarks.fake_openrouter --port 8765 --tokens-per-s 50
+    WORD_MAP_LLM_BASE_URL=http://127.0.0.1:8765 reflex run
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANSWER = (
+    "| First name | Last name | Employer |\n|---|---|---|\n"
+    + "".join(f"| Person{i} | Example | Company {i} |\n" for i in range(40))
+    + "All employers were found in the uploaded documents."
+)
+
+
+def canned_tokens(text: str = CANNED_ANSWER) -> list[str]:
+    """Split the canned answer in word-sized tokens, keeping whitespace."""
+    tokens, current = [], ""
+    for char in text:
+        current += char
+        if char in " \n":
+            tokens.append(current)
+            current = ""
+    if current:
+        tokens.append(current)
+    return tokens
+
+
+class FakeOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set on the server: seconds before the first token and between tokens.
+    server: "FakeOpenRouter"
+
+    def log_message(self, *args):
+        pass
+
+    def _write_chunk(self, data: str):
+        payload = data.encode("utf-8")
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+    def _event(self, payload: dict):
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n")
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "fake/model")
+        tokens = canned_tokens()
+        prompt_chars = len(json.dumps(request.get("messages", [])))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._write_chunk(": OPENROUTER PROCESSING\n\n")
+        time.sleep(self.server.ttft_s)
+        for token in tokens:
+            self._event({"model": model, "choices": [{"index": 0, "delta": {"content": token}}]})
+            time.sleep(self.server.token_interval_s)
+        self._event({
+            "model": model,
+            "choices": [],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(tokens),
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        })
+        self._write_chunk("data: [DONE]\n\n")
+        self._write_chunk("")
+
+
+class FakeOpenRouter(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, tokens_per_s: float = 100.0, ttft_s: float = 0.2):
+        super().__init__(("127.0.0.1", port), FakeOpenRouterHandler)
+        self.token_interval_s = 1.0 / tokens_per_s if tokens_per_s > 0 else 0.0
+        self.ttft_s = ttft_s
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeOpenRouter":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tokens-per-s", type=float, default=100.0)
+    parser.add_argument("--ttft-s", type=float, default=0.2)
+    args = parser.parse_args()
+    server = FakeOpenRouter(args.port, args.tokens_per_s, args.ttft_s)
+    print(f"Fake OpenRouter listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark of the first paint of the page and of the fonts it downloads.
+
+    pip install playwright && playwright install chromium
+    python -m benchmarks.first_paint --url http://localhost:3000 --runs 5
+    python -m benchmarks.first_paint --compare benchmarks/results/<earlier run>.json
+
+Each run loads the page in a fresh browser context, so nothing is cached,
+and records the first paint and first contentful paint of the browser,
+plus the number and size of the font files fetched before the load event
+and the stylesheets blocking the render. Run it once before and once
+after a change to the fonts, against the same build mode.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+PAINT_TIMINGS = """() => {
+    const paints = Object.fromEntries(performance.getEntriesByType("paint").map((e) => [e.name, e.startTime]));
+    const resources = performance.getEntriesByType("resource");
+    const fonts = resources.filter((e) => /\\.(woff2?|ttf|otf)(\\?|$)/.test(e.name) || e.name.includes("fonts.gstatic.com"));
+    return {
+        first_paint_ms: paints["first-paint"] ?? null,
+        first_contentful_paint_ms: paints["first-contentful-paint"] ?? null,
+        font_files: fonts.length,
+        font_bytes: fonts.reduce((total, e) => total + (e.transferSize || e.encodedBodySize || 0), 0),
+        blocking_stylesheets: resources.filter((e) => e.renderBlockingStatus === "blocking" && e.initiatorType === "link").length,
+    };
+}"""
+
+
+def measure(url: str, runs: int) -> list[dict]:
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        sys.exit("This benchmark needs Playwright: pip install playwright && playwright install chromium")
+
+    measurements = []
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        for run in range(runs):
+            context = browser.new_context()
+            page = context.new_page()
+            page.goto(url, wait_until="load")
+            # Fonts requested by the first render may still be in flight at the load event.
+            page.wait_for_load_state("networkidle")
+            timings = page.evaluate(PAINT_TIMINGS)
+            print(f"Run {run + 1}: FCP {timings['first_contentful_paint_ms']} ms, {timings['font_files']} font files")
+            measurements.append(timings)
+            context.close()
+        browser.close()
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:3000")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results.")
+    parser.add_argument("--compare", type=Path, help="Earlier JSON results to compare against.")
+    args = parser.parse_args()
+
+    runs = measure(args.url, args.runs)
+    results = {
+        f"{name}_median": statistics.median(run[name] for run in runs if run[name] is not None)
+        for name in runs[0]
+        if any(run[name] is not None for run in runs)
+    }
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "url": args.url,
+        },
+        "results": results,
+        "runs": runs,
+    }
+    output = args.output or RESULTS_DIR / f"first-paint-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())["results"]
+        print(f"\n{'metric':<40} {'baseline':>12} {'current':>12}")
+        for name, value in results.items():
+            if name in baseline:
+                print(f"{name:<40} {baseline[name]:>12.4g} {value:>12.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Synthetic CV bundles used by the benchmarks."""
+import random
+from pathlib import Path
+
+import fitz # PyMuPDF
+
+FIRST_NAMES = ["Ada", "Alan", "Grace", "Linus", "Margaret", "Dennis", "Barbara", "Ken", "Frances", "John"]
+LAST_NAMES = ["Lovelace", "Turing", "Hopper", "Torvalds", "Hamilton", "Ritchie", "Liskov", "Thompson", "Allen", "Backus"]
+EMPLOYERS = ["Acme Corp", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises", "Cyberdyne"]
+COUNTRIES = ["France", "Germany", "Japan", "Brazil", "Canada", "Kenya", "India", "Australia"]
+SKILLS = ["Python", "SQL", "statistics", "Rust", "machine learning", "Kubernetes", "React", "econometrics"]
+LANGUAGES = ["English", "French", "Spanish", "German", "Mandarin", "Portuguese", "Swahili", "Japanese"]
+
+
+def cv_page(rng: random.Random) -> str:
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    lines = [name, "", "Experience"]
+    for _ in range(rng.randint(3, 6)):
+        lines.append(
+            f"{rng.randint(2005, 2024)}: {rng.choice(['Engineer', 'Analyst', 'Scientist', 'Lead'])} "
+            f"at {rng.choice(EMPLOYERS)}, {rng.choice(COUNTRIES)}"
+        )
+    lines += ["", "Skills: " + ", ".join(rng.sample(SKILLS, 4))]
+    lines += ["Languages: " + ", ".join(rng.sample(LANGUAGES, 3))]
+    lines += ["", "Summary"] + [
+        " ".join(rng.choice(SKILLS + EMPLOYERS + COUNTRIES).lower() for _ in range(12)) for _ in range(20)
+    ]
+    return "\n".join(lines)
+
+
+def generate_pdf(path: Path, n_pages: int, seed: int = 0) -> Path:
+    """Write a PDF of ``n_pages`` CV-like pages, reproducible from ``seed``."""
+    if path.exists():
+        return path
+    rng = random.Random(seed)
+    pdf_doc = fitz.open()
+    for _ in range(n_pages):
+        page = pdf_doc.new_page()
+        page.insert_textbox(fitz.Rect(50, 50, 545, 792), cv_page(rng), fontsize=9)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pdf_doc.save(path)
+    pdf_doc.close()
+    return path
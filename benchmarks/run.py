@@ -0,0 +1,202 @@
+"""Offline benchmark of the ingestion, retrieval, prompt and streaming path.
+
+    python -m benchmarks.run --pages 10 100 1000
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+Everything runs locally: PDFs are generated, and the LLM is the fake
+OpenRouter server of ``benchmarks.fake_openrouter``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+# Metrics where a higher value is better, all others are lower-is-better.
+HIGHER_IS_BETTER = ("pages_per_s", "tokens_per_s")
+
+
+def configure_environment(work_dir: Path, base_url: str):
+    """Point the app at throw-away caches and the fake server.
+
+    Must run before any ``word_map`` module is imported, since they read
+    their settings from the environment at import time.
+    """
+    os.environ["WORD_MAP_CACHE_DIR"] = str(work_dir / "cache")
+    os.environ["WORD_MAP_LLM_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+
+
+def bench_extraction(pdf_path: Path, n_pages: int) -> dict:
+    from word_map.services.extraction import ExtractionCache, extract_async, extract_pages, file_sha256
+
+    start = time.perf_counter()
+    extract_pages(pdf_path)
+    single_process_s = time.perf_counter() - start
+
+    sha256 = file_sha256(pdf_path)
+    start = time.perf_counter()
+    asyncio.run(extract_async(pdf_path, sha256))
+    pool_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asyncio.run(extract_async(pdf_path, sha256))
+    memory_hit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ExtractionCache().get(sha256)
+    disk_hit_s = time.perf_counter() - start
+
+    return {
+        "extract_single_process_s": single_process_s,
+        "extract_single_process_pages_per_s": n_pages / single_process_s,
+        "extract_pool_s": pool_s,
+        "extract_pool_pages_per_s": n_pages / pool_s,
+        "extract_memory_hit_s": memory_hit_s,
+        "extract_disk_hit_s": disk_hit_s,
+    }
+
+
+def bench_prompt(pdf_path: Path, questions: list[str], model: str) -> dict:
+    from word_map.services.documents import ingest_document, register_document
+    from word_map.services.models import get_model_spec
+    from word_map.services.prompt import pack_prompt
+    from word_map.services.retrieval import retrieve_passages, session_index
+
+    record = asyncio.run(ingest_document(register_document(pdf_path)))
+    documents = {record["name"]: record}
+    session_id = f"benchmark-{record['sha256']}"
+
+    start = time.perf_counter()
+    session_index(session_id, documents)
+    index_build_s = time.perf_counter() - start
+
+    # Same steps as State.answer, between the question and the provider call.
+    timings, input_chars = [], 0
+    for question in questions:
+        start = time.perf_counter()
+        passages, stable = retrieve_passages(session_id, documents, question)
+        plan = pack_prompt(get_model_spec(model), question, passages, [], "", stable)
+        timings.append(time.perf_counter() - start)
+        input_chars += len(json.dumps(plan.messages))
+    return {
+        "index_build_s": index_build_s,
+        "prompt_build_s": sum(timings) / len(timings),
+        "prompt_chars": input_chars // len(questions),
+    }
+
+
+async def _stream_once(model: str) -> dict:
+    from word_map.services.llm import ChatStream
+    from word_map.services.streaming import DeltaCoalescer
+
+    stream = ChatStream(model, [{"role": "user", "content": "benchmark"}])
+    coalescer = DeltaCoalescer()
+    start = time.perf_counter()
+    first_token_s = None
+    n_deltas, naive_bytes, text = 0, 0, ""
+    async for delta in stream:
+        if first_token_s is None:
+            first_token_s = time.perf_counter() - start
+        n_deltas += 1
+        # What sending the whole answer after every delta would cost.
+        text += delta
+        naive_bytes += len(text.encode("utf-8"))
+        if coalescer.add(delta):
+            coalescer.flush()
+    coalescer.close(model="benchmark")
+    total_s = time.perf_counter() - start
+    return {
+        "ttft_s": first_token_s or total_s,
+        "stream_total_s": total_s,
+        "tokens_per_s": stream.nb_output_tokens / max(total_s - (first_token_s or 0), 1e-9),
+        "stream_bytes_per_answer": coalescer.bytes_sent,
+        "stream_bytes_per_answer_uncoalesced": naive_bytes,
+        "stream_flushes_per_answer": coalescer.flushes,
+    }
+
+
+def bench_streaming(model: str) -> dict:
+    return asyncio.run(_stream_once(model))
+
+
+def compare(current: dict, baseline: dict, max_regression: float) -> bool:
+    """Print the change of every metric, return False on a regression."""
+    ok = True
+    print(f"\n{'metric':<60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for size, metrics in current["results"].items():
+        for name, value in metrics.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before
+            worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+            flag = ""
+            # Timings under a millisecond are too noisy to fail a run.
+            if worse > max_regression and not (name.endswith("_s") and before < 1e-3):
+                flag, ok = " !", False
+            print(f"{size + ' pages ' + name:<60} {before:>12.4g} {value:>12.4g} {change:>+8.1%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="Token rate of the fake LLM.")
+    parser.add_argument("--ttft-s", type=float, default=0.1, help="Time to first token of the fake LLM.")
+    parser.add_argument("--model", default="google/gemma-3n-e4b-it:free")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results.")
+    parser.add_argument("--compare", type=Path, help="Earlier JSON results to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    from benchmarks.fake_openrouter import FakeOpenRouter
+    from benchmarks.pdfs import generate_pdf
+
+    server = FakeOpenRouter(tokens_per_s=args.tokens_per_s, ttft_s=args.ttft_s).start()
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        configure_environment(work_dir, server.base_url)
+        from word_map.prompts import template_prompts_ddicts
+
+        questions = [template["description"] for template in template_prompts_ddicts.values()]
+        results = {}
+        for n_pages in args.pages:
+            pdf_path = generate_pdf(work_dir / f"cv_bundle_{n_pages}.pdf", n_pages, seed=n_pages)
+            print(f"Benchmarking {n_pages} pages...")
+            results[str(n_pages)] = {
+                **bench_extraction(pdf_path, n_pages),
+                **bench_prompt(pdf_path, questions, args.model),
+                **bench_streaming(args.model),
+            }
+    server.shutdown()
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "tokens_per_s": args.tokens_per_s,
+            "ttft_s": args.ttft_s,
+            "model": args.model,
+        },
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare and not compare(report, json.loads(args.compare.read_text()), args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Benchmark of the time the app takes to answer after a cold start.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --frontend-dir .web/build/client
+    python -m benchmarks.startup --command "reflex run --env prod"
+
+Each run starts the command in a fresh process group, measures the time
+until the backend answers /ping and until / answers, then stops it. The
+default command boots only the backend, as the Modal deployment does; pass
+the directory of a ``reflex export --frontend-only --no-zip`` build to have
+it serve the frontend too.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shlex
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).parent / "results"
+ROOT_DIR = Path(__file__).parent.parent
+
+
+def answers(url: str) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def stop(process: subprocess.Popen):
+    """Stop the command, then whatever server process it left behind."""
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGINT)
+    with contextlib.suppress(subprocess.TimeoutExpired):
+        process.wait(timeout=10)
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL)
+    process.wait()
+
+
+def measure_once(command: list[str], env: dict, ping_url: str, page_url: str, timeout_s: float) -> dict:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=ROOT_DIR, env=env, start_new_session=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    timings = {}
+    try:
+        while len(timings) < 2 and time.perf_counter() - start < timeout_s:
+            if process.poll() is not None:
+                raise RuntimeError(f"{shlex.join(command)} exited with code {process.returncode}.")
+            for name, url in (("ping_s", ping_url), ("page_s", page_url)):
+                if name not in timings and answers(url):
+                    timings[name] = time.perf_counter() - start
+            time.sleep(0.1)
+    finally:
+        stop(process)
+    if len(timings) < 2:
+        raise RuntimeError(f"Not ready after {timeout_s} s: {timings}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--command", help="Command to benchmark, by default a backend-only prod run on --port.")
+    parser.add_argument("--page-url", help="Page to wait for, by default / of the backend.")
+    parser.add_argument("--frontend-dir", type=Path, help="Prebuilt frontend served by the backend.")
+    parser.add_argument("--timeout-s", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results.")
+    args = parser.parse_args()
+
+    command = shlex.split(args.command) if args.command else [
+        "reflex", "run", "--env", "prod", "--backend-only", "--backend-port", str(args.port),
+    ]
+    env = dict(os.environ)
+    if args.frontend_dir:
+        env["WORD_MAP_FRONTEND_DIR"] = str(args.frontend_dir.resolve())
+    ping_url = f"http://127.0.0.1:{args.port}/ping"
+    page_url = args.page_url or f"http://127.0.0.1:{args.port}/"
+
+    runs = []
+    for run in range(args.runs):
+        timings = measure_once(command, env, ping_url, page_url, args.timeout_s)
+        print(f"Run {run + 1}: /ping after {timings['ping_s']:.2f} s, page after {timings['page_s']:.2f} s")
+        runs.append(timings)
+
+    results = {
+        f"{name}_{stat}": func([timings[name] for timings in runs])
+        for name in ("ping_s", "page_s")
+        for stat, func in (("median", statistics.median), ("max", max))
+    }
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "command": shlex.join(command),
+            "frontend_dir": str(args.frontend_dir) if args.frontend_dir else None,
+        },
+        "results": results,
+        "runs": runs,
+    }
+    output = args.output or RESULTS_DIR / f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
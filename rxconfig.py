@@ -1,3 +1,5 @@
+import os
+
 import reflex as rx
 from word_map.style import create_colors_dict
 
@@ -12,6 +14,9 @@ tailwind_config={
 
 config = rx.Config(
     app_name="word_map",    
+    # With a Redis URL, sessions are stored in Redis instead of the memory of
+    # one process, so that several backend workers can serve them.
+    redis_url=os.environ.get("REDIS_URL") or None,
     # api_url="http://localhost:8000",   # for Reflex Cloud 
     # api_url="http://0.0.0.0:8000",   # for Modal
     # backend_port=9000,
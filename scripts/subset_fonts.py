@@ -0,0 +1,132 @@
+"""Download the fonts of the font picker and bundle them as subsetted WOFF2.
+
+    pip install fonttools brotli
+    python -m scripts.subset_fonts
+    python -m scripts.subset_fonts --families Poppins Inter
+
+Each face of ``word_map.style.FONT_FAMILIES`` is fetched from Google Fonts
+and cut into a Latin and a Latin Extended WOFF2 file under assets/fonts,
+next to one stylesheet per family. The stylesheets declare the files with
+``unicode-range`` and ``font-display: swap``, so a browser only downloads
+the faces and the subsets a page actually uses, and shows the fallback
+font meanwhile.
+"""
+import argparse
+import io
+import re
+from pathlib import Path
+
+import httpx
+
+from word_map.style import FONT_FAMILIES, font_slug
+
+ROOT_DIR = Path(__file__).parent.parent
+OUTPUT_DIR = ROOT_DIR / "assets" / "fonts"
+GOOGLE_FONTS_CSS = "https://fonts.googleapis.com/css2"
+# Without a browser user agent, Google Fonts serves whole TrueType files.
+USER_AGENT = "Mozilla/4.0"
+
+# The unicode ranges Google Fonts uses for these subsets.
+SUBSETS = {
+    "latin": (
+        "U+0000-00FF, U+0131, U+0152-0153, U+02BB-02BC, U+02C6, U+02DA, U+02DC, U+0304, "
+        "U+0308, U+0329, U+2000-206F, U+20AC, U+2122, U+2191, U+2193, U+2212, U+2215, U+FEFF, U+FFFD"
+    ),
+    "latin-ext": (
+        "U+0100-02BA, U+02BD-02C5, U+02C7-02CC, U+02CE-02D7, U+02DD-02FF, U+0304, U+0308, U+0329, "
+        "U+1D00-1DBF, U+1E00-1E9F, U+1EF2-1EFF, U+2020, U+20A0-20AB, U+20AD-20C0, U+2113, "
+        "U+2C60-2C7F, U+A720-A7FF"
+    ),
+}
+
+FACE_RE = re.compile(
+    r"font-style:\s*(?P<style>\w+);\s*font-weight:\s*(?P<weight>\d+);.*?src:\s*url\((?P<url>[^)]+)\)",
+    re.DOTALL,
+)
+
+
+def face_name(slug: str, weight: int, style: str, subset: str) -> str:
+    italic = "-italic" if style == "italic" else ""
+    return f"{slug}-{weight}{italic}-{subset}.woff2"
+
+
+def family_query(family: str, weights: tuple[int, ...], italic: bool) -> str:
+    if italic:
+        axes = ";".join([f"0,{weight}" for weight in weights] + [f"1,{weight}" for weight in weights])
+        return f"{family}:ital,wght@{axes}"
+    return f"{family}:wght@{';'.join(str(weight) for weight in weights)}"
+
+
+def fetch_faces(client: httpx.Client, family: str, weights: tuple[int, ...], italic: bool) -> list[dict]:
+    """The faces of a family, with the URL of their TrueType file."""
+    response = client.get(GOOGLE_FONTS_CSS, params={"family": family_query(family, weights, italic)})
+    response.raise_for_status()
+    return [
+        {"style": match["style"], "weight": int(match["weight"]), "url": match["url"].strip("'\"")}
+        for match in FACE_RE.finditer(response.text)
+    ]
+
+
+def subset_font(data: bytes, unicodes: str) -> bytes:
+    from fontTools import subset
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    font = subset.load_font(io.BytesIO(data), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(unicodes))
+    subsetter.subset(font)
+    output = io.BytesIO()
+    subset.save_font(font, output, options)
+    return output.getvalue()
+
+
+def font_face(family: str, face: dict, file_name: str, subset: str) -> str:
+    return (
+        "@font-face {\n"
+        f'  font-family: "{family}";\n'
+        f"  font-style: {face['style']};\n"
+        f"  font-weight: {face['weight']};\n"
+        "  font-display: swap;\n"
+        f'  src: url("{file_name}") format("woff2");\n'
+        f"  unicode-range: {SUBSETS[subset]};\n"
+        "}\n"
+    )
+
+
+def build_family(client: httpx.Client, family: str, spec: dict, output_dir: Path) -> int:
+    """Write the WOFF2 files and the stylesheet of a family, return their size."""
+    slug = font_slug(family)
+    rules = []
+    total = 0
+    for face in fetch_faces(client, family, spec["weights"], spec["italic"]):
+        source = client.get(face["url"])
+        source.raise_for_status()
+        for subset in SUBSETS:
+            file_name = face_name(slug, face["weight"], face["style"], subset)
+            data = subset_font(source.content, SUBSETS[subset])
+            (output_dir / file_name).write_bytes(data)
+            total += len(data)
+            rules.append(font_face(family, face, file_name, subset))
+    (output_dir / f"{slug}.css").write_text("\n".join(rules))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--families", nargs="+", default=list(FONT_FAMILIES), choices=list(FONT_FAMILIES))
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    with httpx.Client(headers={"User-Agent": USER_AGENT}, follow_redirects=True, timeout=30) as client:
+        for family in args.families:
+            size = build_family(client, family, FONT_FAMILIES[family], args.output_dir)
+            print(f"{family}: {size / 1024:.0f} KiB")
+    print(f"Fonts written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
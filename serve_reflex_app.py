@@ -19,6 +19,9 @@
 import os
 import shlex
 import subprocess
+import time
+import urllib.error
+import urllib.request
 from pathlib import Path
 
 import modal
@@ -32,12 +35,16 @@ import modal
 # reflex_script_remote_path = "/root/word_map/word_map.py"
 reflex_script_local_dir = Path(__file__).parent  
 reflex_script_remote_dir = "/root/"
+# URL the browser reaches the backend at, baked into the frontend bundle.
+PUBLIC_URL = os.environ.get("WORD_MAP_PUBLIC_URL", "http://0.0.0.0:8000")
+FRONTEND_DIR = "/root/.web/build/client"
+STARTUP_TIMEOUT_S = int(os.environ.get("WORD_MAP_STARTUP_TIMEOUT_S", "120"))
 
 
 image = (
     modal.Image.debian_slim(python_version="3.13")
     .apt_install(["unzip", "curl"])
-    .pip_install("modal==1.1.0","reflex","python-dotenv==1.1.1","PyMuPDF==1.26.3","httpx==0.28.1","openai==1.97.1")
+    .pip_install("modal==1.1.0","reflex","python-dotenv==1.1.1","PyMuPDF==1.26.3","httpx==0.28.1","openai==1.97.1","h2==4.2.0","numpy==2.3.1","redis==6.2.0","fonttools==4.59.0","brotli==1.1.0")
     # .add_local_file(
         # reflex_script_local_path,
         # reflex_script_remote_path,
@@ -45,11 +52,42 @@ image = (
     .add_local_dir(
         reflex_script_local_dir,
         reflex_script_remote_dir,
+        copy=True,
     )
+    # Self-hosted fonts, bundled from assets/ by the export below.
+    .run_commands("cd /root && python -m scripts.subset_fonts")
+    # Compile the app and build the static frontend once, at image build
+    # time, instead of at every container start. The backend serves it.
+    .run_commands(f"cd /root && REFLEX_API_URL={shlex.quote(PUBLIC_URL)} reflex export --frontend-only --no-zip")
+    .env({"WORD_MAP_FRONTEND_DIR": FRONTEND_DIR})
 )
 
 app = modal.App(name="word_map", image=image)
 
+# Backend worker processes per container. Any worker, in any container, may
+# serve any event of a session, so more than one worker and more than one
+# container both need the Reflex state and the shared caches in Redis.
+# Both settings are forwarded to the container with a secret, as this
+# module is imported again there.
+REDIS_URL = os.environ.get("REDIS_URL", "")
+BACKEND_WORKERS = int(os.environ.get("WORD_MAP_BACKEND_WORKERS", "1"))
+# Containers do not share their disk: a question may reach a container
+# other than the one that received the PDF, which then has to read it.
+# Beyond one container, REFLEX_UPLOADED_FILES_DIR must be the mount point
+# of a file system shared by all of them, checked when a container starts.
+MAX_CONTAINERS = int(os.environ.get("WORD_MAP_MAX_CONTAINERS", "1"))
+UPLOADED_FILES_DIR = os.environ.get("REFLEX_UPLOADED_FILES_DIR", "")
+if (BACKEND_WORKERS > 1 or MAX_CONTAINERS > 1) and not REDIS_URL:
+    raise RuntimeError("REDIS_URL is required to run more than one backend worker or container.")
+if MAX_CONTAINERS > 1 and not UPLOADED_FILES_DIR:
+    raise RuntimeError("REFLEX_UPLOADED_FILES_DIR on shared storage is required to run more than one container.")
+deployment_secret = modal.Secret.from_dict({
+    "REDIS_URL": REDIS_URL,
+    "WORD_MAP_BACKEND_WORKERS": str(BACKEND_WORKERS),
+    "WORD_MAP_MAX_CONTAINERS": str(MAX_CONTAINERS),
+    **({"REFLEX_UPLOADED_FILES_DIR": UPLOADED_FILES_DIR} if UPLOADED_FILES_DIR else {}),
+})
+
 if not reflex_script_local_dir.exists():
     raise RuntimeError(
         "word_map DIR not found!"
@@ -65,13 +103,36 @@ if not reflex_script_local_dir.exists():
 def f():
     print(os.environ["OPENROUTER_API_KEY"])
 
-@app.function()
+def wait_until_ready(url: str, process: subprocess.Popen, timeout_s: float = STARTUP_TIMEOUT_S):
+    """Block until the backend answers on url, fail if it exits or times out."""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The backend exited with code {process.returncode} before it was ready.")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"The backend was not ready after {timeout_s} s.")
+
+
+@app.function(secrets=[deployment_secret], max_containers=MAX_CONTAINERS)
 @modal.concurrent(max_inputs=100)
-@modal.web_server(8000)
+@modal.web_server(8000, startup_timeout=STARTUP_TIMEOUT_S)
 def run():
     # target = shlex.quote(reflex_script_remote_path)
-    cmd = f"REFLEX_API_URL=http://0.0.0.0:8000 reflex run --env prod" # {target} --server.port 8000 --server.enableCORS=false --server.enableXsrfProtection=false"
-    subprocess.Popen(cmd, shell=True)
+    if MAX_CONTAINERS > 1 and not os.path.ismount(UPLOADED_FILES_DIR):
+        raise RuntimeError(f"{UPLOADED_FILES_DIR} is not a mounted file system, uploads would not be shared.")
+    # rxconfig.py reads REDIS_URL from the secret.
+    env = {"REFLEX_API_URL": PUBLIC_URL, "GRANIAN_WORKERS": str(BACKEND_WORKERS)}
+    # The frontend was built into the image: only the backend starts here.
+    cmd = ["reflex", "run", "--env", "prod", "--backend-only", "--backend-port", "8000"]
+    process = subprocess.Popen(cmd, cwd=reflex_script_remote_dir, env={**os.environ, **env})
+    wait_until_ready("http://127.0.0.1:8000/ping", process)
 
 
 # ## Iterate and Deploy
@@ -1,5 +1,6 @@
 import reflex as rx
 from reflex.style import set_color_mode, color_mode
+from word_map import style
 from word_map.state import SettingsState
 from word_map.components.hint import hint
 
@@ -33,6 +34,8 @@ def color_item(color: str) -> rx.Component:
 
 def font_item(font: str) -> rx.Component:
     return rx.box(
+        # The picker previews every family, so it loads them all once opened.
+        rx.el.link(rel="stylesheet", href=style.font_stylesheet(font)),
         rx.text(
             font,
             class_name="font-medium text-slate-12 text-sm truncate",
@@ -52,7 +55,7 @@ def font_item(font: str) -> rx.Component:
 def settings_icon() -> rx.Component:
 
     colors = ["violet", "amber", "green", "blue", "orange", "red"]
-    fonts = ["Instrument Sans", "Poppins", "Inter", "Lato", "Roboto", "Open Sans"]
+    fonts = list(style.FONT_FAMILIES)
 
     return rx.popover.root(
         rx.popover.trigger(
@@ -0,0 +1,18 @@
+template_prompts_ddicts = {
+    "jobs": {"icon": "route",
+             "title": "Get all job positions",
+             "description": "Make a list of all the people mentioned and their past and current places of employment. Your output should be a table with the people's first and last name as column titles, and each employment place as a cell under the respective names",
+    },
+    "countries": {"icon": "earth",
+                  "title": "Map countries of employment",
+                  "description": "Plot a world map and place a pin on each country where the people mentioned worked, with the pin label being the first and last names of the person in question",
+    },
+    "skills": {"icon": "brain-circuit",
+               "title": "List skills",
+               "description": "Make a table with every skill mentioned as the first cell in each row and the names of each person mentioned as the title of a different column. Then add a cross in every cell corresponding to the person and relevant skill. Make sure that the cross is centred horizontally in every column",
+    },
+    "languages": {"icon": "languages",
+                  "title": "Show all languages",
+                  "description": "For every person mentioned, write their first name, last name, and draw next to these the flags corresponding to every language they mention in their language skills",
+    }
+}
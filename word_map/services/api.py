@@ -0,0 +1,60 @@
+import os
+
+from reflex.constants import Endpoint
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.staticfiles import StaticFiles
+
+from word_map.services.metrics import render_prometheus
+
+# Directory of the frontend exported at build time
+# (``reflex export --frontend-only --no-zip`` writes it to .web/build/client).
+# When set, the backend serves it itself and no frontend server is started.
+FRONTEND_DIR = os.environ.get("WORD_MAP_FRONTEND_DIR", "")
+# Paths handled by the backend, everything else is a file of the frontend.
+BACKEND_PATHS = ("/metrics", *(f"/{endpoint.value}" for endpoint in Endpoint))
+# Built assets have content hashes in their names and never change.
+IMMUTABLE_PATHS = ("/assets/",)
+
+
+async def metrics(request):
+    """Prometheus scrape endpoint of this backend worker."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# Mounted in front of the Reflex backend, see ``rx.App(api_transformer=...)``.
+api = Starlette(routes=[Route("/metrics", metrics)])
+
+
+class FrontendFiles:
+    """Serve the exported frontend next to the backend, from one port."""
+
+    def __init__(self, backend, directory: str = FRONTEND_DIR):
+        self.backend = backend
+        self.files = StaticFiles(directory=directory, html=True)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(BACKEND_PATHS):
+            await self.backend(scope, receive, send)
+            return
+        if not scope["path"].startswith(IMMUTABLE_PATHS):
+            await self.files(scope, receive, send)
+            return
+
+        async def send_cached(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message["headers"] = [
+                    *message["headers"],
+                    (b"cache-control", b"public, max-age=31536000, immutable"),
+                ]
+            await send(message)
+
+        await self.files(scope, receive, send_cached)
+
+
+def api_transformers() -> list:
+    """The ASGI layers wrapped around the Reflex backend."""
+    if FRONTEND_DIR:
+        return [api, FrontendFiles]
+    return [api]
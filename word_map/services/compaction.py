@@ -0,0 +1,54 @@
+import os
+
+from word_map.services.llm import ChatStream
+from word_map.services.models import get_model_spec
+from word_map.services.prompt import truncate_to_tokens, with_system
+from word_map.services.resilience import ResilientStream
+
+# Compact once more than COMPACT_AFTER_TURNS turns are not summarized yet,
+# always keeping the last KEEP_RECENT_TURNS turns verbatim.
+COMPACT_AFTER_TURNS = int(os.environ.get("WORD_MAP_COMPACT_AFTER_TURNS", "10"))
+KEEP_RECENT_TURNS = int(os.environ.get("WORD_MAP_KEEP_RECENT_TURNS", "4"))
+SUMMARY_MODEL = os.environ.get("WORD_MAP_SUMMARY_MODEL", "")
+SUMMARY_MAX_TOKENS = int(os.environ.get("WORD_MAP_SUMMARY_MAX_TOKENS", "512"))
+# Longest excerpt of a single answer given to the summarizer.
+TURN_EXCERPT_TOKENS = 1024
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running summary of a conversation between a user and an assistant "
+    "about the user's documents. Update the summary with the new turns below. Keep every "
+    "name, fact, figure and decision the user may refer to later, drop pleasantries and "
+    "formatting. Answer with the updated summary only."
+)
+
+
+def needs_compaction(n_turns: int, n_summarized: int) -> bool:
+    return n_turns - n_summarized > COMPACT_AFTER_TURNS
+
+
+def compaction_range(n_turns: int, n_summarized: int) -> tuple[int, int]:
+    """Turns to fold into the summary: all but the most recent ones."""
+    return n_summarized, max(n_summarized, n_turns - KEEP_RECENT_TURNS)
+
+
+async def summarize_turns(model: str, summary: str, turns: list[tuple[str, str]]) -> str:
+    """Fold turns into a running summary with one (non-cached) LLM call."""
+    transcript = "\n\n".join(
+        f"User: {truncate_to_tokens(user, TURN_EXCERPT_TOKENS)}\n"
+        f"Assistant: {truncate_to_tokens(assistant, TURN_EXCERPT_TOKENS)}"
+        for user, assistant in turns
+    )
+    model = SUMMARY_MODEL or model
+    stream = ResilientStream(ChatStream(
+        model,
+        messages=with_system(
+            get_model_spec(model),
+            [{"role": "system", "content": SUMMARY_INSTRUCTIONS}],
+            [{"role": "user", "content": f"Current summary:\n{summary or '(empty)'}\n\nNew turns:\n{transcript}"}],
+        ),
+        temperature=0.0,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    ))
+    new_summary = "".join([delta async for delta in stream]).strip()
+    # Never let a runaway summary eat the prompt budget it is meant to save.
+    return truncate_to_tokens(new_summary, SUMMARY_MAX_TOKENS)
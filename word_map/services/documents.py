@@ -0,0 +1,55 @@
+import asyncio
+from pathlib import Path
+
+from word_map.services.extraction import extract_async, extraction_cache, file_sha256
+from word_map.services.metrics import span
+
+PENDING = "pending"
+PARSED = "parsed"
+FAILED = "failed"
+
+
+def register_document(path, name: str | None = None, sha256: str | None = None, size: int | None = None) -> dict:
+    """Registry record of an uploaded document, before it is parsed.
+
+    Records only hold metadata; the text itself stays in the extraction
+    cache so that the state synced between events stays small.
+    """
+    path = Path(path)
+    return {
+        "name": name or path.name,
+        "path": str(path),
+        "sha256": sha256 or file_sha256(path),
+        "size": size if size is not None else path.stat().st_size,
+        "status": PENDING,
+        "n_pages": 0,
+        "n_chars": 0,
+    }
+
+
+async def ingest_document(record: dict) -> dict:
+    """Parse a registered document, return its updated record."""
+    try:
+        with span("ingest"):
+            pages = await extract_async(record["path"], record["sha256"])
+    except Exception:
+        return {**record, "status": FAILED}
+    return {
+        **record,
+        "status": PARSED,
+        "n_pages": len(pages),
+        "n_chars": sum(len(page) for page in pages),
+    }
+
+
+async def ready_documents(documents: dict[str, dict]) -> dict[str, dict]:
+    """The parsed documents of a registry, waiting for those still pending."""
+    pending = [name for name, record in documents.items() if record["status"] == PENDING]
+    parsed = await asyncio.gather(*(ingest_document(documents[name]) for name in pending))
+    documents = {**documents, **dict(zip(pending, parsed))}
+    return {name: record for name, record in documents.items() if record["status"] == PARSED}
+
+
+def document_pages(record: dict) -> list[str]:
+    """Pages of a registered document, served from the extraction cache."""
+    return extraction_cache.get_or_extract(record["path"], record["sha256"])
@@ -0,0 +1,128 @@
+import os
+import re
+import tempfile
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from word_map.services.extraction import CACHE_DIR
+
+# Optional: a real sentence embedding model running on CPU through ONNX.
+# Without it, a hashing embedder is used so that the app has no hard dependency.
+try:
+    from fastembed import TextEmbedding
+except ImportError:
+    TextEmbedding = None
+
+EMBEDDING_MODEL = os.environ.get("WORD_MAP_EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+HASHING_DIM = 512
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbedder:
+    """Dependency-free embedder based on feature hashing.
+
+    Words and character trigrams are hashed into a fixed number of buckets,
+    so that inflections ("employer", "employment") still land close together.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str):
+        for word in _WORD_RE.findall(text.lower()):
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i : i + 3], 0.5
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dim] += sign * weight
+        return normalize(vectors)
+
+
+class FastEmbedEmbedder:
+    """Local ONNX sentence embeddings, CPU only."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        self._model = TextEmbedding(model_name=model_name)
+        self.name = model_name.replace("/", "--")
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return normalize(np.asarray(list(self._model.embed(texts)), dtype=np.float32))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+_embedder = None
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = FastEmbedEmbedder() if TextEmbedding is not None else HashingEmbedder()
+    return _embedder
+
+
+class EmbeddingStore:
+    """Chunk embeddings of each document, stored as int8 matrices on disk.
+
+    Every row is quantized with its own scale, so a score is
+    ``(matrix @ query) * scales``. Matrices are memory-mapped when read and
+    are shared by every session that uploaded the same file.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR / "embeddings"):
+        self.directory = Path(directory)
+
+    def _paths(self, sha256: str, chunking: str, embedder_name: str) -> tuple[Path, Path]:
+        stem = f"{sha256}-{chunking}-{embedder_name}"
+        return self.directory / f"{stem}.int8.npy", self.directory / f"{stem}.scales.npy"
+
+    def load(self, sha256: str, chunking: str, embedder_name: str) -> tuple[np.ndarray, np.ndarray] | None:
+        matrix_path, scales_path = self._paths(sha256, chunking, embedder_name)
+        try:
+            return np.load(matrix_path, mmap_mode="r"), np.load(scales_path)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, sha256: str, chunking: str, embedder_name: str, vectors: np.ndarray):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        matrix = np.ascontiguousarray(np.round(vectors / scales[:, None]).astype(np.int8))
+        matrix_path, scales_path = self._paths(sha256, chunking, embedder_name)
+        # The matrix is written last: its presence marks a complete entry.
+        for path, array in ((scales_path, scales.astype(np.float32)), (matrix_path, matrix)):
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=f"{path.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file_object:
+                    np.save(file_object, array)
+                os.replace(tmp_name, path)
+            except BaseException:
+                os.unlink(tmp_name)
+                raise
+
+    def get_or_embed(self, sha256: str, chunking: str, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Embeddings of the chunks of a document, ``chunking`` naming how it was cut."""
+        embedder = get_embedder()
+        stored = self.load(sha256, chunking, embedder.name)
+        if stored is None or stored[0].shape[0] != len(texts):
+            vectors = embedder.embed(texts) if texts else np.zeros((0, 1), dtype=np.float32)
+            self.save(sha256, chunking, embedder.name, vectors)
+            stored = self.load(sha256, chunking, embedder.name)
+        return stored
+
+
+embedding_store = EmbeddingStore()
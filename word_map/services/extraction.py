@@ -0,0 +1,219 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import fitz # PyMuPDF
+
+from word_map.services.shared_store import get_shared_store
+
+# Bump whenever the way text is pulled out of a PDF changes, so that
+# cached extractions from an older extractor are never served.
+EXTRACTOR_VERSION = "pymupdf-text-1"
+
+CACHE_DIR = Path(os.environ.get("WORD_MAP_CACHE_DIR", ".word_map_cache"))
+MEMORY_CACHE_SIZE = int(os.environ.get("WORD_MAP_EXTRACTION_CACHE_SIZE", "64"))
+# Processes parsing PDFs in the background, and pages handed to each task.
+INGEST_WORKERS = int(os.environ.get("WORD_MAP_INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+PAGES_PER_TASK = int(os.environ.get("WORD_MAP_INGEST_PAGES_PER_TASK", "32"))
+
+
+def file_sha256(path, chunk_size: int = 1 << 20) -> str:
+    """Hash the content of a file without loading it in memory at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_object:
+        for block in iter(lambda: file_object.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_pages(path) -> list[str]:
+    """Extract the text of every page of a PDF, one string per page."""
+    with fitz.open(path) as pdf_doc:
+        return [page.get_text("text") for page in pdf_doc]
+
+
+def extract_page_range(path, start: int, stop: int) -> list[str]:
+    """Extract the text of pages ``start`` to ``stop`` (excluded) of a PDF."""
+    with fitz.open(path) as pdf_doc:
+        return [pdf_doc.load_page(page_num).get_text("text") for page_num in range(start, stop)]
+
+
+def count_pages(path) -> int:
+    with fitz.open(path) as pdf_doc:
+        return pdf_doc.page_count
+
+
+class ExtractionCache:
+    """Tiered cache of extracted PDF text keyed by content hash.
+
+    The first tier is an in-memory LRU, the second one is a directory of
+    JSON files that survives restarts of the backend. When a shared store
+    is configured, it is the third tier, so that a document parsed by one
+    worker is never parsed again by another, nor needs its PDF there.
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR / "extraction", max_items: int = MEMORY_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.max_items = max_items
+        self._memory: OrderedDict[str, list[str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sha256: str) -> str:
+        return f"{sha256}-{EXTRACTOR_VERSION}"
+
+    def _disk_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def _remember(self, key: str, pages: list[str]):
+        with self._lock:
+            self._memory[key] = pages
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, sha256: str) -> list[str] | None:
+        key = self.key(sha256)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        disk_path = self._disk_path(key)
+        try:
+            with disk_path.open("r", encoding="utf-8") as file_object:
+                pages = json.load(file_object)
+        except (OSError, ValueError):
+            pages = self._get_shared(key)
+            if pages is None:
+                return None
+            self._write_disk(key, pages)
+        self._remember(key, pages)
+        return pages
+
+    @staticmethod
+    def _get_shared(key: str) -> list[str] | None:
+        store = get_shared_store()
+        value = store.get(f"pages:{key}") if store is not None else None
+        try:
+            return json.loads(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def put(self, sha256: str, pages: list[str]):
+        key = self.key(sha256)
+        self._remember(key, pages)
+        self._write_disk(key, pages)
+        store = get_shared_store()
+        if store is not None:
+            store.set(f"pages:{key}", json.dumps(pages))
+
+    def _write_disk(self, key: str, pages: list[str]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a truncated entry.
+        disk_path = self._disk_path(key)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, prefix=f"{disk_path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file_object:
+                json.dump(pages, file_object)
+            os.replace(tmp_name, disk_path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+    def get_or_extract(self, path, sha256: str | None = None) -> list[str]:
+        """Return the pages of a PDF, parsing it only on a cache miss."""
+        sha256 = sha256 or file_sha256(path)
+        pages = self.get(sha256)
+        if pages is None:
+            pages = extract_pages(path)
+            self.put(sha256, pages)
+        return pages
+
+
+extraction_cache = ExtractionCache()
+
+_process_pool: ProcessPoolExecutor | None = None
+# Extractions running in this process, so that a document is parsed once
+# even when the upload and a question ask for it at the same time.
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Never fork the server: it runs threads, whose locks a forked child
+        # would inherit in whatever state they were.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _process_pool
+
+
+@contextlib.asynccontextmanager
+async def process_pool_lifespan():
+    """Stop the parsing processes when the backend shuts down."""
+    global _process_pool
+    yield
+    if _process_pool is not None:
+        pool, _process_pool = _process_pool, None
+        await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+
+def _drop_process_pool(pool: ProcessPoolExecutor):
+    """Forget a broken pool, so that the next call starts a fresh one."""
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _parse_ranges(pool: ProcessPoolExecutor, path, ranges: list[tuple[int, int]]) -> list[list[str]]:
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(loop.run_in_executor(pool, extract_page_range, str(path), start, stop) for start, stop in ranges)
+    )
+
+
+async def _extract_in_pool(path, sha256: str) -> list[str]:
+    page_count = await asyncio.to_thread(count_pages, path)
+    ranges = [
+        (start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+    pool = get_process_pool()
+    try:
+        parts = await _parse_ranges(pool, path, ranges)
+    except BrokenProcessPool:
+        # A worker died, e.g. killed for its memory, and the pool refuses any
+        # further task: start a fresh one and try once more.
+        _drop_process_pool(pool)
+        parts = await _parse_ranges(get_process_pool(), path, ranges)
+    pages = [page for part in parts for page in part]
+    await asyncio.to_thread(extraction_cache.put, sha256, pages)
+    return pages
+
+
+async def extract_async(path, sha256: str) -> list[str]:
+    """Pages of a PDF, parsed in the process pool on a cache miss.
+
+    Large documents are split in ranges of PAGES_PER_TASK pages parsed in
+    parallel. Concurrent calls for the same content share one extraction.
+    """
+    pages = await asyncio.to_thread(extraction_cache.get, sha256)
+    if pages is not None:
+        return pages
+    future = _inflight.get(sha256)
+    if future is None:
+        future = asyncio.ensure_future(_extract_in_pool(path, sha256))
+        _inflight[sha256] = future
+        future.add_done_callback(lambda _: _inflight.pop(sha256, None))
+    # Shielded: a cancelled question must not cancel the shared extraction.
+    return await asyncio.shield(future)
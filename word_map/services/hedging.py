@@ -0,0 +1,103 @@
+import asyncio
+import contextlib
+import os
+
+from word_map.services.llm import ChatStream
+from word_map.services.metrics import Counter
+
+# Opt-in: when the selected model has not produced a token after
+# HEDGE_DELAY_S, the same request is also sent to HEDGE_BACKUP_MODEL and
+# the first stream to produce a token is kept. The backup should have a
+# context window at least as large as the models it stands in for.
+HEDGE_ENABLED = os.environ.get("WORD_MAP_LLM_HEDGE", "0") == "1"
+HEDGE_DELAY_S = float(os.environ.get("WORD_MAP_LLM_HEDGE_DELAY_S", "3.0"))
+HEDGE_BACKUP_MODEL = os.environ.get("WORD_MAP_LLM_HEDGE_BACKUP_MODEL", "mistralai/mistral-small-3.2-24b-instruct:free")
+
+hedged_requests = Counter(
+    "word_map_hedged_requests_total",
+    "LLM requests that fired a backup request, by winner (primary or backup) and model.",
+)
+
+
+async def _cancel(task: asyncio.Task | None, iterator):
+    """Stop a losing stream and release its connection."""
+    if task is not None and not task.done():
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await task
+    with contextlib.suppress(Exception):
+        await iterator.aclose()
+
+
+class HedgedStream:
+    """Race a primary stream against a delayed backup, keep the first to answer.
+
+    Exposes the interface of ``ChatStream``; ``model`` and token counts are
+    those of the stream that won.
+    """
+
+    cached = False
+
+    def __init__(self, primary: ChatStream, backup: ChatStream, delay_s: float = HEDGE_DELAY_S):
+        self.primary = primary
+        self.backup = backup
+        self.delay_s = delay_s
+        self.winner = primary
+
+    @property
+    def model(self) -> str:
+        return self.winner.model
+
+    @property
+    def nb_input_tokens(self) -> int:
+        return self.winner.nb_input_tokens
+
+    @property
+    def nb_output_tokens(self) -> int:
+        return self.winner.nb_output_tokens
+
+    @property
+    def nb_cached_tokens(self) -> int:
+        return self.winner.nb_cached_tokens
+
+    async def __aiter__(self):
+        iterators = {self.primary: aiter(self.primary)}
+        tasks = {self.primary: asyncio.ensure_future(anext(iterators[self.primary]))}
+        done, _ = await asyncio.wait(tasks.values(), timeout=self.delay_s)
+
+        # Fire the backup when the primary is slow, or failed before its first token.
+        if not done or tasks[self.primary].exception() is not None:
+            iterators[self.backup] = aiter(self.backup)
+            tasks[self.backup] = asyncio.ensure_future(anext(iterators[self.backup]))
+
+        winner = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_COMPLETED)
+                for stream, task in list(tasks.items()):
+                    if task not in done:
+                        continue
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = stream
+                        break
+                    # A failed stream is dropped; the error surfaces if none is left.
+                    del tasks[stream]
+                    if not tasks:
+                        raise error
+                if winner is not None:
+                    break
+        finally:
+            for stream, task in tasks.items():
+                if stream is not winner:
+                    await _cancel(task, iterators[stream])
+
+        self.winner = winner
+        if len(iterators) > 1:
+            hedged_requests.inc(winner="primary" if winner is self.primary else "backup", model=self.primary.model)
+        first = tasks[winner]
+        if isinstance(first.exception(), StopAsyncIteration):
+            return
+        yield first.result()
+        async for delta in iterators[winner]:
+            yield delta
@@ -0,0 +1,129 @@
+import contextlib
+import json
+import os
+
+from dotenv import load_dotenv
+import httpx
+
+# Load environment variables
+load_dotenv(".env")
+
+# OpenRouter exposes an OpenAI-compatible API, queried directly over a
+# shared, pooled HTTP client instead of the blocking SDK client.
+BASE_URL = os.environ.get("WORD_MAP_LLM_BASE_URL", "https://openrouter.ai/api/v1")
+MAX_CONNECTIONS = int(os.environ.get("WORD_MAP_LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("WORD_MAP_LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY_S = float(os.environ.get("WORD_MAP_LLM_KEEPALIVE_EXPIRY_S", "30"))
+CONNECT_TIMEOUT_S = float(os.environ.get("WORD_MAP_LLM_CONNECT_TIMEOUT_S", "10"))
+READ_TIMEOUT_S = float(os.environ.get("WORD_MAP_LLM_READ_TIMEOUT_S", "120"))
+POOL_TIMEOUT_S = float(os.environ.get("WORD_MAP_LLM_POOL_TIMEOUT_S", "30"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = os.environ.get("WORD_MAP_LLM_HTTP2", "1") == "1"
+except ImportError:
+    HTTP2 = False
+
+
+class LLMError(Exception):
+    """Error returned by the provider, before or during a stream."""
+
+    def __init__(self, message: str, status_code: int | None = None, headers: dict | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The HTTP client shared by every session of this backend worker."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            http2=HTTP2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY_S,
+            ),
+            timeout=httpx.Timeout(
+                READ_TIMEOUT_S, connect=CONNECT_TIMEOUT_S, pool=POOL_TIMEOUT_S
+            ),
+            headers={"Authorization": f"Bearer {os.environ.get('OPENROUTER_API_KEY')}"},
+        )
+    return _http_client
+
+
+@contextlib.asynccontextmanager
+async def http_client_lifespan():
+    """Close the pooled connections when the backend shuts down."""
+    yield
+    if _http_client is not None:
+        await _http_client.aclose()
+
+
+class ChatStream:
+    """Async iterator over the text deltas of a streamed chat completion.
+
+    The model that actually answered and the token usage are read from the
+    chunks as they arrive; usage is only known once the stream is exhausted.
+    """
+
+    cached = False
+
+    def __init__(self, model: str, messages: list[dict], **params):
+        self.model = model
+        self.messages = messages
+        self.params = params
+        self.nb_input_tokens = 0
+        self.nb_output_tokens = 0
+        # Prompt tokens served from the provider's prompt cache.
+        self.nb_cached_tokens = 0
+
+    def _consume(self, chunk: dict) -> str:
+        if "error" in chunk:
+            error = chunk["error"]
+            raise LLMError(error.get("message", str(error)), error.get("code"))
+        if chunk.get("model"):
+            self.model = chunk["model"]
+        if chunk.get("usage"):
+            self.nb_input_tokens = chunk["usage"].get("prompt_tokens") or 0
+            self.nb_output_tokens = chunk["usage"].get("completion_tokens") or 0
+            details = chunk["usage"].get("prompt_tokens_details") or {}
+            self.nb_cached_tokens = details.get("cached_tokens") or 0
+        if not chunk.get("choices"):
+            return ""
+        return (chunk["choices"][0].get("delta") or {}).get("content") or ""
+
+    async def __aiter__(self):
+        payload = {
+            "model": self.model,
+            "messages": self.messages,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            **self.params,
+        }
+        async with get_http_client().stream("POST", "/chat/completions", json=payload) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise LLMError(
+                    body.decode("utf-8", "replace"), response.status_code, dict(response.headers)
+                )
+            # Server-sent events: "data: {...}" lines, ": ..." keep-alive comments.
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError as error:
+                    # A malformed or truncated event ends the answer like any provider error.
+                    raise LLMError(f"Malformed stream event: {data[:200]}", status_code=None) from error
+                delta = self._consume(chunk)
+                if delta:
+                    yield delta
@@ -0,0 +1,47 @@
+import os
+from dataclasses import dataclass
+
+# Number of most recent messages sent to and mounted by the client; older
+# ones stay in the backend store until the user asks for them.
+WINDOW_SIZE = int(os.environ.get("WORD_MAP_CHAT_WINDOW", "20"))
+
+
+@dataclass(slots=True)
+class Message:
+    """One question of a chat and its answer."""
+
+    id: int
+    question: str
+    answer: str = ""
+    model: str = ""
+    nb_input_tokens: int = 0
+    nb_output_tokens: int = 0
+    cached: bool = False
+    nb_cached_tokens: int = 0
+
+    def row(self) -> tuple:
+        """The message as rendered by the client."""
+        return (
+            self.id,
+            self.question,
+            self.answer,
+            self.model,
+            self.nb_input_tokens,
+            self.nb_output_tokens,
+            self.cached,
+            self.nb_cached_tokens,
+        )
+
+
+def find_message(messages: list[Message], message_id: int) -> Message | None:
+    """A message by id, searched from the most recent one."""
+    for message in reversed(messages):
+        if message.id == message_id:
+            return message
+        if message.id < message_id:
+            break
+    return None
+
+
+def message_window(messages: list[Message], size: int = WINDOW_SIZE) -> list[tuple]:
+    return [message.row() for message in messages[-size:]] if size > 0 else []
@@ -0,0 +1,154 @@
+import contextlib
+import json
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Every metric created, in creation order, for the /metrics endpoint.
+REGISTRY: list = []
+# Default histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+TOKENS_BUCKETS = (100, 500, 1_000, 2_000, 4_000, 8_000, 16_000, 32_000, 64_000, 128_000)
+
+
+class Counter:
+    """Monotonic counter, one value per combination of labels."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(tuple(sorted(labels.items())), 0.0)
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, one per combination of labels."""
+
+    def __init__(self, name: str, description: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self.values: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self.values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(key: tuple, **extra) -> str:
+    items = [*key, *extra.items()]
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _number(value: float) -> str:
+    return "+Inf" if math.isinf(value) else repr(float(value))
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        kind = "counter" if isinstance(metric, Counter) else "histogram"
+        lines += [f"# HELP {metric.name} {metric.description}", f"# TYPE {metric.name} {kind}"]
+        with metric._lock:
+            values = {key: list(value) if kind == "histogram" else value for key, value in metric.values.items()}
+        for key, value in values.items():
+            if kind == "counter":
+                lines.append(f"{metric.name}{_labels(key)} {_number(value)}")
+                continue
+            for bound, count in zip((*metric.buckets, math.inf), value):
+                lines.append(f"{metric.name}_bucket{_labels(key, le=_number(bound))} {_number(count)}")
+            lines.append(f"{metric.name}_sum{_labels(key)} {_number(value[-1])}")
+            lines.append(f"{metric.name}_count{_labels(key)} {_number(value[-2])}")
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = Histogram(
+    "word_map_stage_seconds",
+    "Duration of each stage of an upload or an answer, by stage and model.",
+)
+llm_tokens = Histogram(
+    "word_map_llm_tokens",
+    "Tokens per LLM call, by direction (input or output) and model.",
+    buckets=TOKENS_BUCKETS,
+)
+
+
+def log_event(event: str, **fields):
+    """Structured log line, one JSON object per event."""
+    logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def record_stage(stage: str, seconds: float, **labels):
+    stage_seconds.observe(seconds, stage=stage, **labels)
+    log_event("stage", stage=stage, seconds=round(seconds, 6), **labels)
+
+
+@contextlib.contextmanager
+def span(stage: str, **labels):
+    """Time a block of code as one stage, also usable inside coroutines."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, **labels)
+
+
+llm_cost_usd = Counter(
+    "word_map_llm_cost_usd_total",
+    "Estimated spend on LLM calls in USD, from the registry prices, by model.",
+)
+
+
+def record_tokens(model: str, nb_input_tokens: int, nb_output_tokens: int, cost_usd: float = 0.0, **fields):
+    llm_tokens.observe(nb_input_tokens, direction="input", model=model)
+    llm_tokens.observe(nb_output_tokens, direction="output", model=model)
+    llm_cost_usd.inc(cost_usd, model=model)
+    log_event(
+        "llm_usage",
+        model=model,
+        nb_input_tokens=nb_input_tokens,
+        nb_output_tokens=nb_output_tokens,
+        cost_usd=round(cost_usd, 6),
+        **fields,
+    )
+
+
+stream_bytes = Histogram(
+    "word_map_stream_bytes_per_answer",
+    "Bytes of answer text sent to the client while streaming one answer.",
+    buckets=BYTES_BUCKETS,
+)
+stream_flushes = Histogram(
+    "word_map_stream_flushes_per_answer",
+    "State updates sent to the client while streaming one answer.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
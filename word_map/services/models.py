@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """What the app needs to know about a model to budget its prompts."""
+
+    name: str
+    # Prompt and completion tokens, together.
+    context_length: int
+    max_output_tokens: int
+    # USD per million tokens.
+    input_price: float = 0.0
+    output_price: float = 0.0
+    # Whether the provider only caches prompts at explicit cache_control
+    # breakpoints (Anthropic, Gemini); others cache prefixes automatically.
+    explicit_cache_control: bool = False
+    # Whether the model takes system messages; Gemma on Google AI Studio
+    # rejects them, so its instructions go in the first user message.
+    system_role: bool = True
+
+
+# The models offered in the model selector, in display order.
+MODEL_REGISTRY = {
+    spec.name: spec
+    for spec in [
+        ModelSpec("google/gemma-3n-e4b-it:free", context_length=8_192, max_output_tokens=2_048, system_role=False),
+        ModelSpec("openai/gpt-3.5-turbo", context_length=16_385, max_output_tokens=4_096, input_price=0.5, output_price=1.5),
+        ModelSpec("deepseek/deepseek-r1-0528:free", context_length=163_840, max_output_tokens=16_384),
+        ModelSpec("qwen/qwen3-coder:free", context_length=262_144, max_output_tokens=16_384),
+        ModelSpec("mistralai/mistral-small-3.2-24b-instruct:free", context_length=131_072, max_output_tokens=16_384),
+    ]
+}
+DEFAULT_MODEL = "google/gemma-3n-e4b-it:free"
+
+
+def get_model_spec(name: str) -> ModelSpec:
+    """Spec of a model, with conservative limits for unknown ones."""
+    return MODEL_REGISTRY.get(name) or ModelSpec(
+        name,
+        context_length=8_192,
+        max_output_tokens=1_024,
+        explicit_cache_control=name.startswith(("anthropic/", "google/gemini")),
+        system_role=not name.startswith("google/gemma"),
+    )
+
+
+def estimate_cost(spec: ModelSpec, nb_input_tokens: int, nb_output_tokens: int) -> float:
+    """Price of a call in USD, from the registry prices (0 for free models)."""
+    return (nb_input_tokens * spec.input_price + nb_output_tokens * spec.output_price) / 1_000_000
@@ -0,0 +1,138 @@
+import asyncio
+import os
+from collections import OrderedDict
+
+import httpx
+
+from word_map.services.llm import ChatStream, LLMError
+from word_map.services.metrics import Counter, log_event
+from word_map.services.models import get_model_spec
+from word_map.services.prompt import pack_prompt, request_params
+from word_map.services.resilience import ResilientStream
+from word_map.services.response_cache import cache_key, cacheable, response_cache
+from word_map.services.retrieval import retrieve_passages
+from word_map.services.scheduler import QueueFull, scheduler
+from word_map.services.shared_store import get_shared_store
+
+# Opt-in: once a session's documents are parsed, answer the template prompts
+# in the background so that a click on a template card is served from the
+# response cache. Speculative calls of a session never spend more than
+# MAX_SESSION_TOKENS tokens (prompt and answer) in total, counted in the
+# shared store when there is one, so across every worker.
+PREFETCH_ENABLED = os.environ.get("WORD_MAP_PREFETCH", "0") == "1"
+MAX_SESSION_TOKENS = int(os.environ.get("WORD_MAP_PREFETCH_MAX_SESSION_TOKENS", "40000"))
+MAX_SESSIONS = 4096
+
+prefetch_requests = Counter(
+    "word_map_prefetch_requests_total",
+    "Speculative template answers, by outcome (stored, cached, over_budget, cancelled or error).",
+)
+
+_tasks: dict[str, asyncio.Task] = {}
+_spent: OrderedDict[str, int] = OrderedDict()
+
+
+def spent_tokens(session_id: str) -> int:
+    store = get_shared_store()
+    if store is not None:
+        return int(store.get(f"prefetch_spent:{session_id}") or 0)
+    return _spent.get(session_id, 0)
+
+
+def _spend(session_id: str, tokens: int):
+    store = get_shared_store()
+    if store is not None:
+        store.incr(f"prefetch_spent:{session_id}", tokens)
+        return
+    _spent[session_id] = _spent.pop(session_id, 0) + tokens
+    while len(_spent) > MAX_SESSIONS:
+        _spent.popitem(last=False)
+
+
+def _generation(session_id: str) -> int:
+    store = get_shared_store()
+    value = store.get(f"prefetch:{session_id}") if store is not None else None
+    return int(value or 0)
+
+
+def _cancel_local(session_id: str):
+    task = _tasks.pop(session_id, None)
+    if task is not None:
+        task.cancel()
+
+
+async def cancel_prefetch(session_id: str):
+    """Stop the speculative calls of a session, e.g. when its documents change.
+
+    A prefetch running on another worker notices the bumped generation
+    before its next call.
+    """
+    _cancel_local(session_id)
+    store = get_shared_store()
+    if store is not None:
+        await asyncio.to_thread(store.incr, f"prefetch:{session_id}")
+
+
+async def _prefetch_one(session_id: str, user_id: str, model: str, documents: dict[str, dict], question: str) -> str:
+    # Same prompt assembly as a click on the card of an empty chat, hence the same cache key.
+    passages, stable_passages = await asyncio.to_thread(retrieve_passages, session_id, documents, question)
+    plan = pack_prompt(get_model_spec(model), question, passages, [], "", stable_passages)
+    params = request_params(plan)
+    if not cacheable(params):
+        return "uncacheable"
+    key = cache_key(model, plan.messages, [document["sha256"] for document in documents.values()], params)
+    if await response_cache.get(key) is not None:
+        return "cached"
+    # Budgeted on the worst case: the whole prompt and a full-length answer.
+    if await asyncio.to_thread(spent_tokens, session_id) + plan.allocation["used"] + plan.max_tokens > MAX_SESSION_TOKENS:
+        return "over_budget"
+
+    stream = ResilientStream(ChatStream(model, messages=plan.messages, **params), max_attempts=1)
+    try:
+        async with scheduler.slot(user_id, background=True):
+            answer = "".join([delta async for delta in stream])
+    finally:
+        # Usage is unknown when the call failed or was cancelled, count the prompt.
+        await asyncio.to_thread(
+            _spend, session_id, (stream.nb_input_tokens + stream.nb_output_tokens) or plan.allocation["used"]
+        )
+    await response_cache.put(key, stream.model, answer, stream.nb_input_tokens, stream.nb_output_tokens)
+    return "stored"
+
+
+async def _prefetch(session_id: str, user_id: str, model: str, documents: dict[str, dict], questions: list[str]):
+    generation = await asyncio.to_thread(_generation, session_id)
+    for question in questions:
+        if await asyncio.to_thread(_generation, session_id) != generation:
+            prefetch_requests.inc(outcome="cancelled", model=model)
+            return
+        try:
+            outcome = await _prefetch_one(session_id, user_id, model, documents, question)
+        except (LLMError, httpx.HTTPError, QueueFull) as error:
+            outcome = "error"
+            log_event("prefetch_error", model=model, error=str(error)[:500])
+        prefetch_requests.inc(outcome=outcome, model=model)
+        if outcome == "over_budget":
+            return
+
+
+async def prefetch_answers(session_id: str, user_id: str, model: str, documents: dict[str, dict], questions: list[str]):
+    """Answer questions ahead of time into the response cache, one at a time.
+
+    A new prefetch of a session replaces the one still running.
+    """
+    await cancel_prefetch(session_id)
+    # Another prefetch of the session may have started during the await.
+    _cancel_local(session_id)
+    task = asyncio.create_task(_prefetch(session_id, user_id, model, documents, questions))
+    _tasks[session_id] = task
+    try:
+        await task
+    except asyncio.CancelledError:
+        prefetch_requests.inc(outcome="cancelled", model=model)
+        # Only swallow the cancellation of the prefetch, not of its caller.
+        if asyncio.current_task().cancelling():
+            raise
+    finally:
+        if _tasks.get(session_id) is task:
+            del _tasks[session_id]
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+
+from word_map.services.models import ModelSpec
+
+logger = logging.getLogger(__name__)
+
+# Tokens kept free for the answer, capped by the model's own output limit.
+OUTPUT_RESERVE_TOKENS = int(os.environ.get("WORD_MAP_OUTPUT_RESERVE_TOKENS", "1024"))
+# Share of the budget left unused to absorb errors of the token estimate.
+SAFETY_MARGIN = float(os.environ.get("WORD_MAP_PROMPT_SAFETY_MARGIN", "0.1"))
+# Tokens added by the chat template around every message.
+MESSAGE_OVERHEAD_TOKENS = 4
+CHARS_PER_TOKEN = 4
+
+INSTRUCTIONS = "The content of the user's documents, if any, is given as PROMPT_CONTEXT. Use PROMPT_CONTEXT to help yourself answer user prompts."
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token count estimate, without loading any tokenizer.
+
+    About four characters per token for English prose, but never fewer
+    tokens than whitespace-separated words.
+    """
+    return max(len(text) // CHARS_PER_TOKEN, len(text.split())) + 1
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    return text[: max(tokens, 0) * CHARS_PER_TOKEN]
+
+
+@dataclass
+class PromptPlan:
+    """Messages of one request and how the token budget was spent."""
+
+    messages: list[dict]
+    max_tokens: int
+    allocation: dict[str, int] = field(default_factory=dict)
+
+
+def request_params(plan: PromptPlan) -> dict:
+    """Sampling parameters of an answer, greedy so that answers can be cached."""
+    return {"temperature": 0.0, "top_p": 0.1, "max_tokens": plan.max_tokens}
+
+
+def _text(text: str, cache_control: bool):
+    """Message content, with a cache breakpoint for providers that need one."""
+    if not cache_control:
+        return text
+    return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+
+def with_system(spec: ModelSpec, system_messages: list[dict], messages: list[dict]) -> list[dict]:
+    """Prepend system messages, or fold them into the first user message.
+
+    For models without a system role the instructions are put at the top
+    of the first user message; they stay the first bytes of the prompt, so
+    the prefix is as stable as with a system role.
+    """
+    if spec.system_role:
+        return system_messages + messages
+    contents = [message["content"] for message in system_messages] + [messages[0]["content"]]
+    if all(isinstance(content, str) for content in contents):
+        content = "\n\n".join(contents)
+    else:
+        content = [
+            part
+            for content in contents
+            for part in (content if isinstance(content, list) else [{"type": "text", "text": content}])
+        ]
+    return [{"role": "user", "content": content}, *messages[1:]]
+
+
+def pack_prompt(
+    spec: ModelSpec,
+    question: str,
+    passages: list[str],
+    turns: list[tuple[str, str]],
+    summary: str = "",
+    stable_passages: bool = False,
+) -> PromptPlan:
+    """Fill the context window of a model in priority order.
+
+    Instructions come first, then the question, then as many retrieved
+    passages as fit (most relevant first), then the summary of the older
+    turns and the most recent turns of the conversation. Whatever does not
+    fit is left out.
+
+    Messages are laid out so that their prefix only changes when it has to,
+    which lets providers reuse their prompt cache from one turn to the
+    next: instructions, then the documents when ``stable_passages`` says
+    they do not depend on the question, then the summary and the turns as
+    role messages. Passages retrieved for the question go with it in the
+    last message.
+    """
+    max_tokens = min(spec.max_output_tokens, OUTPUT_RESERVE_TOKENS)
+    budget = int((spec.context_length - max_tokens) * (1 - SAFETY_MARGIN))
+
+    system_tokens = estimate_tokens(INSTRUCTIONS) + MESSAGE_OVERHEAD_TOKENS
+    used = system_tokens
+
+    question_tokens = estimate_tokens(question) + MESSAGE_OVERHEAD_TOKENS
+    if used + question_tokens > budget:
+        question = truncate_to_tokens(question, budget - used - MESSAGE_OVERHEAD_TOKENS)
+        question_tokens = estimate_tokens(question) + MESSAGE_OVERHEAD_TOKENS
+    used += question_tokens
+
+    kept_passages = []
+    passages_tokens = 0
+    for passage in passages:
+        tokens = estimate_tokens(passage)
+        # Smaller, less relevant passages may still fit after a large one did not.
+        if used + tokens <= budget:
+            kept_passages.append(passage)
+            passages_tokens += tokens
+            used += tokens
+
+    summary_tokens = estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+    if used + summary_tokens > budget:
+        summary, summary_tokens = "", 0
+    used += summary_tokens
+
+    kept_turns: list[tuple[str, str]] = []
+    history_tokens = 0
+    for user, assistant in reversed(turns):
+        tokens = estimate_tokens(user) + estimate_tokens(assistant) + 2 * MESSAGE_OVERHEAD_TOKENS
+        # The history stays contiguous: stop at the first turn that does not fit.
+        if used + tokens > budget:
+            break
+        kept_turns.insert(0, (user, assistant))
+        history_tokens += tokens
+        used += tokens
+
+    context = "\n\n".join(kept_passages)
+    system = INSTRUCTIONS
+    if stable_passages and context:
+        system = f"{INSTRUCTIONS}\n\nPROMPT_CONTEXT:\n\n{context}"
+    system_messages = [{"role": "system", "content": _text(system, spec.explicit_cache_control)}]
+    if summary:
+        system_messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    messages = []
+    for user, assistant in kept_turns:
+        messages.append({"role": "user", "content": user})
+        messages.append({"role": "assistant", "content": assistant})
+    if context and not stable_passages:
+        question = f"PROMPT_CONTEXT:\n\n{context}\n\n{question}"
+    messages.append({"role": "user", "content": question})
+    messages = with_system(spec, system_messages, messages)
+
+    allocation = {
+        "budget": budget,
+        "used": used,
+        "max_tokens": max_tokens,
+        "system": system_tokens,
+        "question": question_tokens,
+        "passages": passages_tokens,
+        "passages_kept": len(kept_passages),
+        "passages_dropped": len(passages) - len(kept_passages),
+        "summary": summary_tokens,
+        "history": history_tokens,
+        "turns_kept": len(kept_turns),
+        "turns_dropped": len(turns) - len(kept_turns),
+    }
+    logger.info("prompt allocation %s", json.dumps({"model": spec.name, **allocation}))
+    return PromptPlan(messages=messages, max_tokens=max_tokens, allocation=allocation)
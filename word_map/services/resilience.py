@@ -0,0 +1,272 @@
+import asyncio
+import contextlib
+import email.utils
+import os
+import random
+import time
+
+import httpx
+
+from word_map.services.llm import ChatStream, LLMError
+from word_map.services.metrics import Counter, log_event
+from word_map.services.models import ModelSpec, get_model_spec
+from word_map.services.scheduler import QueueFull
+
+# A request is tried at most MAX_ATTEMPTS times, waiting a random delay of
+# up to BASE_DELAY_S * 2**attempt between tries ("full jitter"), never more
+# than MAX_DELAY_S, and never less than the provider's Retry-After.
+MAX_ATTEMPTS = int(os.environ.get("WORD_MAP_LLM_MAX_ATTEMPTS", "4"))
+BASE_DELAY_S = float(os.environ.get("WORD_MAP_LLM_RETRY_BASE_DELAY_S", "0.5"))
+MAX_DELAY_S = float(os.environ.get("WORD_MAP_LLM_RETRY_MAX_DELAY_S", "20"))
+# A model is set aside for BREAKER_COOLDOWN_S after BREAKER_FAILURES
+# consecutive failed requests, then tried again with a single request.
+BREAKER_FAILURES = int(os.environ.get("WORD_MAP_LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.environ.get("WORD_MAP_LLM_BREAKER_COOLDOWN_S", "30"))
+
+# Statuses worth retrying: timeouts, throttling and server-side failures.
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504, 520, 522, 524, 529}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+llm_retries = Counter(
+    "word_map_llm_retries_total",
+    "LLM requests retried after a transient error, by model and reason.",
+)
+llm_breaker_trips = Counter(
+    "word_map_llm_breaker_trips_total",
+    "Times the circuit breaker of a model opened.",
+)
+
+
+class CircuitOpen(LLMError):
+    """The model failed too often recently and is not queried for now."""
+
+
+def _status(error: Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def error_kind(error: Exception) -> str:
+    """Short, label-friendly class of an LLM call error."""
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.TransportError):
+        return "network"
+    status = _status(error)
+    if status == 429:
+        return "rate_limited"
+    if status is not None and status >= 500:
+        return "server"
+    if status is not None:
+        return "client"
+    return "provider"
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether sending the same request again may succeed.
+
+    Network errors and timeouts are, so are throttling and server errors.
+    Bad requests, auth and credit errors are not. Neither is a stream
+    error without a status, as the provider gave up on the request itself.
+    """
+    if isinstance(error, CircuitOpen):
+        return False
+    if isinstance(error, httpx.TransportError):
+        return True
+    return _status(error) in RETRYABLE_STATUSES
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds the provider asked to wait, from a Retry-After header."""
+    headers = getattr(error, "headers", None) or {}
+    value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(date.timestamp() - time.time(), 0.0)
+
+
+def backoff_delay(attempt: int, error: Exception | None = None) -> float:
+    delay = random.uniform(0, min(MAX_DELAY_S, BASE_DELAY_S * 2**attempt))
+    wait = retry_after(error) if error is not None else None
+    if wait is not None:
+        delay = max(delay, min(wait, MAX_DELAY_S))
+    return delay
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker of one model."""
+
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, cooldown_s: float = BREAKER_COOLDOWN_S):
+        self.name = name
+        self.failures = failures
+        self.cooldown_s = cooldown_s
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < self.failures:
+            return CLOSED
+        if time.monotonic() - self.opened_at < self.cooldown_s:
+            return OPEN
+        return HALF_OPEN
+
+    def allow(self) -> bool:
+        """Whether a request may be sent; only one probe goes out when half open."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        self._probing = False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.consecutive_failures >= self.failures:
+            if self.consecutive_failures == self.failures:
+                llm_breaker_trips.inc(model=self.name)
+                log_event("llm_breaker_open", model=self.name)
+            self.opened_at = time.monotonic()
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model)
+    return breaker
+
+
+def unavailable_models() -> list[str]:
+    """Models currently set aside by their circuit breaker."""
+    return sorted(name for name, breaker in _breakers.items() if breaker.state == OPEN)
+
+
+def _is_free(spec: ModelSpec) -> bool:
+    return not spec.input_price and not spec.output_price
+
+
+def available_model(model: str, candidates: dict[str, ModelSpec]) -> str:
+    """The model if its breaker lets requests through, else the first candidate that does.
+
+    Only candidates of the same price tier are considered: a free model is
+    never replaced by a paid one behind the user's back.
+    """
+    if get_breaker(model).state != OPEN:
+        return model
+    free = _is_free(get_model_spec(model))
+    return next(
+        (name for name, spec in candidates.items() if _is_free(spec) == free and get_breaker(name).state != OPEN),
+        model,
+    )
+
+
+def error_message(error: Exception) -> str:
+    """What to tell the user when an answer could not be produced."""
+    if isinstance(error, QueueFull):
+        return str(error)
+    if not isinstance(error, (LLMError, httpx.HTTPError)):
+        return "Something went wrong while answering, please retry."
+    kind = error_kind(error)
+    if kind == "circuit_open":
+        return "This model is temporarily unavailable, please select another one."
+    if kind == "rate_limited":
+        return "The model provider is rate limiting requests, please retry in a moment."
+    if kind in ("server", "timeout", "network"):
+        return "The model provider could not be reached, please retry in a moment."
+    return f"The model provider returned an error: {error}"
+
+
+class ResilientStream:
+    """Retry a ``ChatStream`` on transient errors until its first token.
+
+    Once text has been streamed to the user the request cannot be replayed
+    without repeating it, so later errors are raised as they are. Every
+    outcome is reported to the circuit breaker of the model.
+    """
+
+    cached = False
+
+    def __init__(self, stream: ChatStream, max_attempts: int = MAX_ATTEMPTS):
+        self.stream = stream
+        self.max_attempts = max_attempts
+        self.breaker = get_breaker(stream.model)
+        self.attempts = 0
+
+    @property
+    def model(self) -> str:
+        return self.stream.model
+
+    @property
+    def nb_input_tokens(self) -> int:
+        return self.stream.nb_input_tokens
+
+    @property
+    def nb_output_tokens(self) -> int:
+        return self.stream.nb_output_tokens
+
+    @property
+    def nb_cached_tokens(self) -> int:
+        return self.stream.nb_cached_tokens
+
+    async def __aiter__(self):
+        requested = self.stream.model
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpen(f"{requested} is temporarily unavailable", 503)
+            self.attempts += 1
+            # A fresh request each time; the served model is only known from its chunks.
+            self.stream.model = requested
+            streamed = False
+            try:
+                async with contextlib.aclosing(aiter(self.stream)) as deltas:
+                    async for delta in deltas:
+                        streamed = True
+                        yield delta
+            except (LLMError, httpx.HTTPError) as error:
+                retryable = is_retryable(error)
+                # Only transient errors say something about the health of the model,
+                # others leave its failure count as it was.
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release_probe()
+                if streamed or not retryable or self.attempts >= self.max_attempts:
+                    raise
+                delay = backoff_delay(self.attempts - 1, error)
+                llm_retries.inc(model=requested, reason=error_kind(error))
+                log_event("llm_retry", model=requested, attempt=self.attempts, reason=error_kind(error), delay_s=round(delay, 3))
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled, e.g. a losing hedge: let another request probe the model.
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return
@@ -0,0 +1,175 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from word_map.services.extraction import CACHE_DIR
+from word_map.services.metrics import Counter
+from word_map.services.shared_store import get_shared_store
+
+ENABLED = os.environ.get("WORD_MAP_RESPONSE_CACHE", "1") == "1"
+DB_PATH = CACHE_DIR / "responses.sqlite3"
+TTL_S = float(os.environ.get("WORD_MAP_RESPONSE_CACHE_TTL_S", str(7 * 24 * 3600)))
+MAX_BYTES = int(os.environ.get("WORD_MAP_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_ENTRIES = int(os.environ.get("WORD_MAP_RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+# Only (near) deterministic completions are worth serving again.
+MAX_TEMPERATURE = float(os.environ.get("WORD_MAP_RESPONSE_CACHE_MAX_TEMPERATURE", "0.0"))
+# Size of the slices a cached answer is replayed in.
+REPLAY_CHARS = 16
+
+response_cache_requests = Counter(
+    "word_map_response_cache_requests_total",
+    "LLM response cache lookups, by result (hit or miss).",
+)
+
+
+def _normalize(content):
+    if isinstance(content, str):
+        return " ".join(content.split())
+    return content
+
+
+def cache_key(model: str, messages: list[dict], doc_hashes: list[str], params: dict) -> str:
+    """Fingerprint of a request: model, messages, context documents and sampling."""
+    payload = {
+        "model": model,
+        "messages": [
+            {**message, "content": _normalize(message.get("content"))} for message in messages
+        ],
+        "documents": sorted(doc_hashes),
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def cacheable(params: dict) -> bool:
+    return ENABLED and params.get("temperature", 1.0) <= MAX_TEMPERATURE
+
+
+class CachedStream:
+    """Replays a cached answer with the interface of ``ChatStream``."""
+
+    cached = True
+    # No provider call, so no provider-side prompt cache either.
+    nb_cached_tokens = 0
+
+    def __init__(self, model: str, answer: str, nb_input_tokens: int, nb_output_tokens: int):
+        self.model = model
+        self.answer = answer
+        self.nb_input_tokens = nb_input_tokens
+        self.nb_output_tokens = nb_output_tokens
+
+    async def __aiter__(self):
+        for start in range(0, len(self.answer), REPLAY_CHARS):
+            yield self.answer[start : start + REPLAY_CHARS]
+            # Let other sessions run between slices.
+            await asyncio.sleep(0)
+
+
+class ResponseCache:
+    """SQLite-backed LLM response cache with TTL, LRU eviction and size caps."""
+
+    def __init__(self, path=DB_PATH, ttl_s: float = TTL_S, max_bytes: int = MAX_BYTES, max_entries: int = MAX_ENTRIES):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    nb_input_tokens INTEGER NOT NULL,
+                    nb_output_tokens INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._initialized = True
+        return connection
+
+    def _get(self, key: str) -> CachedStream | None:
+        now = time.time()
+        with contextlib.closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT model, answer, nb_input_tokens, nb_output_tokens, created_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is not None and now - row[4] > self.ttl_s:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        if row is None:
+            return self._get_shared(key)
+        return CachedStream(*row[:4])
+
+    def _get_shared(self, key: str) -> CachedStream | None:
+        """An answer stored by another worker, copied to the local database."""
+        store = get_shared_store()
+        value = store.get(f"responses:{key}") if store is not None else None
+        if value is None:
+            return None
+        try:
+            row = json.loads(value)
+        except ValueError:
+            return None
+        self._put_local(key, *row)
+        return CachedStream(*row)
+
+    def _put(self, key: str, model: str, answer: str, nb_input_tokens: int, nb_output_tokens: int):
+        self._put_local(key, model, answer, nb_input_tokens, nb_output_tokens)
+        store = get_shared_store()
+        if store is not None:
+            store.set(
+                f"responses:{key}",
+                json.dumps([model, answer, nb_input_tokens, nb_output_tokens]),
+                int(self.ttl_s),
+            )
+
+    def _put_local(self, key: str, model: str, answer: str, nb_input_tokens: int, nb_output_tokens: int):
+        now = time.time()
+        with contextlib.closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, answer, nb_input_tokens, nb_output_tokens, len(answer.encode("utf-8")), now, now),
+            )
+            connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_s,))
+            # Evict the least recently used entries beyond the caps.
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if entries > self.max_entries or size > self.max_bytes:
+                rows = connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+                evicted = []
+                for row_key, row_size in rows:
+                    if entries <= self.max_entries and size <= self.max_bytes:
+                        break
+                    evicted.append((row_key,))
+                    entries -= 1
+                    size -= row_size
+                connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    async def get(self, key: str) -> CachedStream | None:
+        stream = await asyncio.to_thread(self._get, key)
+        response_cache_requests.inc(result="hit" if stream is not None else "miss")
+        return stream
+
+    async def put(self, key: str, model: str, answer: str, nb_input_tokens: int, nb_output_tokens: int):
+        if answer:
+            await asyncio.to_thread(self._put, key, model, answer, nb_input_tokens, nb_output_tokens)
+
+
+response_cache = ResponseCache()
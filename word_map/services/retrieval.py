@@ -0,0 +1,260 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+from word_map.services.documents import document_pages
+from word_map.services.embeddings import TextEmbedding, embedding_store, get_embedder
+
+# Number of chunks packed into the prompt.
+TOP_K = int(os.environ.get("WORD_MAP_RAG_TOP_K", "8"))
+# Below this many characters the whole corpus is sent instead of retrieved chunks.
+FULL_CONTEXT_MAX_CHARS = int(os.environ.get("WORD_MAP_RAG_FULL_CONTEXT_MAX_CHARS", "12000"))
+CHUNK_CHARS = int(os.environ.get("WORD_MAP_RAG_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP_CHARS = int(os.environ.get("WORD_MAP_RAG_CHUNK_OVERLAP_CHARS", "200"))
+# One of "bm25", "dense" or "hybrid" (both, merged with reciprocal rank fusion).
+# Dense retrieval is only on by default with a sentence embedding model installed:
+# the hashing fallback adds little to BM25 but the cost of embedding every chunk.
+RETRIEVER = os.environ.get("WORD_MAP_RAG_RETRIEVER", "hybrid" if TextEmbedding is not None else "bm25")
+# Names how documents are cut in chunks, so that stored embeddings follow it.
+CHUNKING = f"chunks{CHUNK_CHARS}-{CHUNK_OVERLAP_CHARS}"
+RRF_K = 60
+MAX_SESSION_INDEXES = 256
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def chunk_pages(pages: list[str], doc: str, chunk_chars: int = CHUNK_CHARS, overlap_chars: int = CHUNK_OVERLAP_CHARS) -> list[dict]:
+    """Split the pages of a document into overlapping chunks.
+
+    Chunks never span two pages, so every chunk can be cited with its page
+    number. Cuts are moved back to the closest whitespace when possible.
+    """
+    chunks = []
+    for page_num, text in enumerate(pages, start=1):
+        text = text.strip()
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_chars, len(text))
+            if end < len(text):
+                cut = text.rfind(" ", start + chunk_chars // 2, end)
+                end = cut if cut != -1 else end
+            chunks.append({"doc": doc, "page": page_num, "text": text[start:end].strip()})
+            if end == len(text):
+                break
+            start = max(end - overlap_chars, start + 1)
+    return chunks
+
+
+@lru_cache(maxsize=256)
+def _cached_chunks(sha256: str, name: str, path: str) -> tuple[dict, ...]:
+    return tuple(chunk_pages(document_pages({"path": path, "sha256": sha256}), name))
+
+
+def document_chunks(document: dict) -> tuple[dict, ...]:
+    """Chunks of a registered document, computed once per file content."""
+    return _cached_chunks(document["sha256"], document["name"], document["path"])
+
+
+def chunk_key(chunk: dict) -> tuple:
+    return (chunk["doc"], chunk["page"], chunk["text"])
+
+
+class BM25Index:
+    """In-process inverted index with Okapi BM25 scoring.
+
+    Documents are added and removed incrementally, one registry record at a
+    time, so re-indexing only happens for the files that changed.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks: dict[int, dict] = {}
+        self.chunk_lengths: dict[int, int] = {}
+        self.postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self.doc_chunks: dict[str, list[int]] = {}
+        self.total_length = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add_document(self, sha256: str, chunks):
+        with self._lock:
+            if sha256 in self.doc_chunks:
+                return
+            ids = []
+            for chunk in chunks:
+                chunk_id = self._next_id
+                self._next_id += 1
+                terms = Counter(tokenize(chunk["text"]))
+                for term, tf in terms.items():
+                    self.postings[term][chunk_id] = tf
+                length = sum(terms.values())
+                self.chunks[chunk_id] = chunk
+                self.chunk_lengths[chunk_id] = length
+                self.total_length += length
+                ids.append(chunk_id)
+            self.doc_chunks[sha256] = ids
+
+    def remove_document(self, sha256: str):
+        with self._lock:
+            for chunk_id in self.doc_chunks.pop(sha256, []):
+                chunk = self.chunks.pop(chunk_id)
+                self.total_length -= self.chunk_lengths.pop(chunk_id)
+                for term in set(tokenize(chunk["text"])):
+                    postings = self.postings.get(term)
+                    if postings is not None:
+                        postings.pop(chunk_id, None)
+                        if not postings:
+                            del self.postings[term]
+
+    def sync(self, documents: dict[str, dict]):
+        """Bring the index in line with a session's document registry."""
+        wanted = {document["sha256"]: document for document in documents.values()}
+        for sha256 in set(self.doc_chunks) - set(wanted):
+            self.remove_document(sha256)
+        for sha256, document in wanted.items():
+            if sha256 not in self.doc_chunks:
+                self.add_document(sha256, document_chunks(document))
+
+    def search(self, query: str, k: int = TOP_K) -> list[tuple[float, dict]]:
+        with self._lock:
+            n_chunks = len(self.chunks)
+            if not n_chunks:
+                return []
+            avg_length = self.total_length / n_chunks or 1.0
+            scores: dict[int, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[chunk_id] / avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(score, self.chunks[chunk_id]) for chunk_id, score in best]
+
+
+class DenseIndex:
+    """Vector index over the int8 chunk embeddings of a session's documents.
+
+    A search is one matrix-vector product per document followed by a single
+    ``argpartition`` over all the scores; there is no Python loop per chunk.
+    """
+
+    def __init__(self):
+        self.docs: dict[str, tuple[np.ndarray, np.ndarray, tuple[dict, ...]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(chunks) for _, _, chunks in self.docs.values())
+
+    def sync(self, documents: dict[str, dict]):
+        wanted = {document["sha256"]: document for document in documents.values()}
+        with self._lock:
+            for sha256 in set(self.docs) - set(wanted):
+                del self.docs[sha256]
+            for sha256, document in wanted.items():
+                if sha256 in self.docs:
+                    continue
+                chunks = document_chunks(document)
+                if chunks:
+                    matrix, scales = embedding_store.get_or_embed(sha256, CHUNKING, [chunk["text"] for chunk in chunks])
+                    self.docs[sha256] = (matrix, scales, chunks)
+
+    def search(self, query: str, k: int = TOP_K) -> list[tuple[float, dict]]:
+        with self._lock:
+            docs = list(self.docs.values())
+        if not docs:
+            return []
+        query_vector = get_embedder().embed([query])[0]
+        scores = np.concatenate([(matrix @ query_vector) * scales for matrix, scales, _ in docs])
+        offsets = np.cumsum([0] + [len(chunks) for _, _, chunks in docs])
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        doc_indices = np.searchsorted(offsets, best, side="right") - 1
+        return [
+            (float(scores[i]), docs[d][2][i - offsets[d]])
+            for i, d in zip(best.tolist(), doc_indices.tolist())
+        ]
+
+
+class SessionIndex:
+    """Lexical and dense indexes of the documents of one session."""
+
+    def __init__(self, retriever: str = RETRIEVER):
+        self.retriever = retriever
+        self.bm25 = BM25Index() if retriever in ("bm25", "hybrid") else None
+        self.dense = DenseIndex() if retriever in ("dense", "hybrid") else None
+
+    def sync(self, documents: dict[str, dict]):
+        for index in (self.bm25, self.dense):
+            if index is not None:
+                index.sync(documents)
+
+    def search(self, query: str, k: int = TOP_K) -> list[tuple[float, dict]]:
+        rankings = [index.search(query, k) for index in (self.bm25, self.dense) if index is not None]
+        if len(rankings) == 1:
+            return rankings[0]
+        # Reciprocal rank fusion: robust to the different scales of both scores.
+        fused: dict[tuple, list] = {}
+        for ranking in rankings:
+            for rank, (_, chunk) in enumerate(ranking):
+                entry = fused.setdefault(chunk_key(chunk), [0.0, chunk])
+                entry[0] += 1.0 / (RRF_K + rank + 1)
+        best = sorted(fused.values(), key=lambda entry: entry[0], reverse=True)[:k]
+        return [(score, chunk) for score, chunk in best]
+
+
+_session_indexes: OrderedDict[str, SessionIndex] = OrderedDict()
+_session_indexes_lock = threading.Lock()
+
+
+def session_index(session_id: str, documents: dict[str, dict]) -> SessionIndex:
+    """Indexes of a session's documents, kept between questions."""
+    with _session_indexes_lock:
+        index = _session_indexes.pop(session_id, None) or SessionIndex()
+        _session_indexes[session_id] = index
+        while len(_session_indexes) > MAX_SESSION_INDEXES:
+            _session_indexes.popitem(last=False)
+    index.sync(documents)
+    return index
+
+
+def format_chunk(chunk: dict) -> str:
+    return f"[{chunk['doc']}, page {chunk['page']}]\n{chunk['text']}"
+
+
+def retrieve_passages(session_id: str, documents: dict[str, dict], question: str, k: int = TOP_K) -> tuple[list[str], bool]:
+    """Passages of the documents relevant to a question, most relevant first.
+
+    Tiny corpora are sent whole, page by page and in a canonical document
+    order; larger ones are reduced to the top-k chunks returned by the
+    session retriever. The flag tells whether the passages are the whole
+    corpus, hence the same whatever the question.
+    """
+    if not documents:
+        return [], True
+    if sum(document["n_chars"] for document in documents.values()) <= FULL_CONTEXT_MAX_CHARS:
+        ordered = sorted(documents.values(), key=lambda document: (document["sha256"], document["name"]))
+        return [
+            format_chunk({"doc": document["name"], "page": page_num, "text": page.strip()})
+            for document in ordered
+            for page_num, page in enumerate(document_pages(document), start=1)
+            if page.strip()
+        ], True
+    hits = session_index(session_id, documents).search(question, k)
+    return [format_chunk(chunk) for _, chunk in hits], False
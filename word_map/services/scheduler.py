@@ -0,0 +1,176 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from word_map.services.metrics import Counter, Histogram
+
+# LLM calls in flight at once, for the whole worker and for a single user;
+# the per-user limit lets a batch of the four template prompts run at once.
+GLOBAL_LIMIT = int(os.environ.get("WORD_MAP_LLM_GLOBAL_CONCURRENCY", "32"))
+PER_USER_LIMIT = int(os.environ.get("WORD_MAP_LLM_USER_CONCURRENCY", "4"))
+# Requests waiting for a slot beyond this are rejected.
+MAX_QUEUE = int(os.environ.get("WORD_MAP_LLM_MAX_QUEUE", "200"))
+# Share of the global slots that background (speculative) requests may take.
+BACKGROUND_SHARE = float(os.environ.get("WORD_MAP_LLM_BACKGROUND_SHARE", "0.5"))
+# How often a waiting request refreshes its place in the queue on screen.
+QUEUE_POLL_S = float(os.environ.get("WORD_MAP_LLM_QUEUE_POLL_S", "1.0"))
+
+queue_wait_seconds = Histogram(
+    "word_map_llm_queue_wait_seconds",
+    "Time an LLM request waited for a slot.",
+)
+queue_rejections = Counter(
+    "word_map_llm_queue_rejections_total",
+    "LLM requests rejected because the queue was full.",
+)
+
+
+class QueueFull(Exception):
+    """Too many requests are already waiting for a slot."""
+
+
+class Ticket:
+    """A request waiting for, then holding, an LLM slot."""
+
+    __slots__ = ("user_id", "background", "enqueued_at", "granted_at", "granted", "released")
+
+    def __init__(self, user_id: str, background: bool = False):
+        self.user_id = user_id
+        self.background = background
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self.granted = asyncio.get_running_loop().create_future()
+        self.released = False
+
+    @property
+    def waited_s(self) -> float:
+        """Seconds spent in the queue, so far if still waiting."""
+        return (self.granted_at or time.monotonic()) - self.enqueued_at
+
+
+class FairScheduler:
+    """Admission control for LLM calls with round-robin fairness.
+
+    Slots are bounded globally and per user. Waiting requests are queued
+    per user and users are served in turn, so one user sending many
+    requests only delays their own. Background requests are only served
+    when no interactive request can be, and never take more than a share
+    of the global slots.
+    """
+
+    def __init__(
+        self,
+        global_limit: int = GLOBAL_LIMIT,
+        per_user_limit: int = PER_USER_LIMIT,
+        max_queue: int = MAX_QUEUE,
+        background_share: float = BACKGROUND_SHARE,
+    ):
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+        self.background_limit = max(1, int(global_limit * background_share))
+        # Users with waiting requests, in serving order.
+        self._queues: OrderedDict[str, deque[Ticket]] = OrderedDict()
+        # Waiting background requests, first come first served.
+        self._background: deque[Ticket] = deque()
+        self._running: dict[str, int] = {}
+        self._running_total = 0
+        self._queued_total = 0
+
+    def submit(self, user_id: str, background: bool = False) -> Ticket:
+        if self._queued_total >= self.max_queue:
+            queue_rejections.inc()
+            raise QueueFull("Too many questions are waiting, please retry in a moment.")
+        ticket = Ticket(user_id, background)
+        if background:
+            self._background.append(ticket)
+        else:
+            self._queues.setdefault(user_id, deque()).append(ticket)
+        self._queued_total += 1
+        self._dispatch()
+        return ticket
+
+    def _next_ticket(self) -> Ticket | None:
+        user_id = next(
+            (user for user in self._queues if self._running.get(user, 0) < self.per_user_limit),
+            None,
+        )
+        if user_id is not None:
+            queue = self._queues.pop(user_id)
+            ticket = queue.popleft()
+            # The user goes to the back of the line if they still have requests waiting.
+            if queue:
+                self._queues[user_id] = queue
+            return ticket
+        if self._running_total < self.background_limit:
+            for ticket in self._background:
+                if self._running.get(ticket.user_id, 0) < self.per_user_limit:
+                    self._background.remove(ticket)
+                    return ticket
+        return None
+
+    def _dispatch(self):
+        while self._running_total < self.global_limit:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            user_id = ticket.user_id
+            self._queued_total -= 1
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+            self._running_total += 1
+            ticket.granted_at = time.monotonic()
+            queue_wait_seconds.observe(ticket.waited_s, priority="background" if ticket.background else "interactive")
+            ticket.granted.set_result(None)
+
+    def release(self, ticket: Ticket):
+        """Give back a slot, or withdraw a request that is still waiting."""
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.granted.done():
+            self._running[ticket.user_id] -= 1
+            if not self._running[ticket.user_id]:
+                del self._running[ticket.user_id]
+            self._running_total -= 1
+        else:
+            ticket.granted.cancel()
+            queue = self._background if ticket.background else self._queues.get(ticket.user_id)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                self._queued_total -= 1
+                if not queue and not ticket.background:
+                    del self._queues[ticket.user_id]
+        self._dispatch()
+
+    def position(self, ticket: Ticket) -> int:
+        """Requests served before this one under round robin, 0 once granted."""
+        if ticket.granted.done():
+            return 0
+        queue = self._queues.get(ticket.user_id)
+        if queue is None or ticket not in queue:
+            return 0
+        rounds = queue.index(ticket)
+        ahead = rounds
+        before = True
+        for user_id, other in self._queues.items():
+            if user_id == ticket.user_id:
+                before = False
+                continue
+            # Users before this one in the rotation get one more turn.
+            ahead += min(len(other), rounds + before)
+        return ahead + 1
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, background: bool = False):
+        """Hold a slot for the duration of the block, waiting for it first."""
+        ticket = self.submit(user_id, background)
+        try:
+            await ticket.granted
+            yield ticket
+        finally:
+            self.release(ticket)
+
+
+scheduler = FairScheduler()
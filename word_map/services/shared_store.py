@@ -0,0 +1,114 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Key-value store shared by every backend worker, e.g. the Redis instance
+# that also holds the Reflex state. "memory://" is an in-process fake for
+# local runs with a single worker. Unset, nothing is shared and each
+# worker only relies on its own caches.
+SHARED_STORE_URL = (
+    os.environ.get("WORD_MAP_SHARED_STORE_URL")
+    or os.environ.get("REFLEX_REDIS_URL")
+    or os.environ.get("REDIS_URL")
+    or ""
+)
+KEY_PREFIX = os.environ.get("WORD_MAP_SHARED_STORE_PREFIX", "word_map:")
+DEFAULT_TTL_S = int(os.environ.get("WORD_MAP_SHARED_STORE_TTL_S", str(7 * 24 * 3600)))
+
+
+class MemoryStore:
+    """In-process stand-in for Redis, with the same expiry semantics."""
+
+    def __init__(self):
+        self._data: dict[str, tuple[str, float | None]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry is not None else None
+
+    def set(self, key: str, value: str, ttl_s: int | None = DEFAULT_TTL_S):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl_s if ttl_s else None)
+
+    def incr(self, key: str, amount: int = 1, ttl_s: int | None = DEFAULT_TTL_S) -> int:
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[0]) + amount if entry is not None else amount
+            self._data[key] = (str(value), time.monotonic() + ttl_s if ttl_s else None)
+            return value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisStore:
+    """Shared store backed by Redis; keys are namespaced with KEY_PREFIX.
+
+    Reads and writes of cached data degrade to misses when Redis cannot be
+    reached, as every worker can rebuild what it needs on its own.
+    """
+
+    def __init__(self, url: str, prefix: str = KEY_PREFIX):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.errors = redis.RedisError
+
+    def get(self, key: str) -> str | None:
+        try:
+            return self.client.get(self.prefix + key)
+        except self.errors as error:
+            logger.warning("shared store read failed: %s", error)
+            return None
+
+    def set(self, key: str, value: str, ttl_s: int | None = DEFAULT_TTL_S):
+        try:
+            self.client.set(self.prefix + key, value, ex=ttl_s or None)
+        except self.errors as error:
+            logger.warning("shared store write failed: %s", error)
+
+    def incr(self, key: str, amount: int = 1, ttl_s: int | None = DEFAULT_TTL_S) -> int:
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.incrby(self.prefix + key, amount)
+                if ttl_s:
+                    pipe.expire(self.prefix + key, ttl_s)
+                return pipe.execute()[0]
+        except self.errors as error:
+            logger.warning("shared store write failed: %s", error)
+            return 0
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(self.prefix + key)
+        except self.errors as error:
+            logger.warning("shared store write failed: %s", error)
+
+
+_store: MemoryStore | RedisStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_shared_store() -> MemoryStore | RedisStore | None:
+    """The store shared by the workers, None when the app runs without one."""
+    global _store
+    if not SHARED_STORE_URL:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = MemoryStore() if SHARED_STORE_URL.startswith("memory://") else RedisStore(SHARED_STORE_URL)
+    return _store
@@ -0,0 +1,55 @@
+import os
+import time
+
+from word_map.services.metrics import stream_bytes, stream_flushes
+
+# Send the streamed answer to the client at most every FLUSH_INTERVAL_MS,
+# or as soon as FLUSH_TOKENS deltas are waiting, whichever comes first.
+FLUSH_INTERVAL_MS = int(os.environ.get("WORD_MAP_STREAM_FLUSH_INTERVAL_MS", "80"))
+FLUSH_TOKENS = int(os.environ.get("WORD_MAP_STREAM_FLUSH_TOKENS", "24"))
+# Answers of a batch are written into the chat history, re-sent whole on
+# every flush, so they are flushed less often.
+BATCH_FLUSH_INTERVAL_MS = int(os.environ.get("WORD_MAP_BATCH_FLUSH_INTERVAL_MS", "250"))
+BATCH_FLUSH_TOKENS = int(os.environ.get("WORD_MAP_BATCH_FLUSH_TOKENS", "96"))
+
+
+class DeltaCoalescer:
+    """Buffer streamed deltas and tell when the client should be updated.
+
+    Every flush re-sends the text streamed so far, so ``bytes_sent`` is the
+    size of the state updates of one answer.
+    """
+
+    def __init__(self, interval_ms: int = FLUSH_INTERVAL_MS, max_tokens: int = FLUSH_TOKENS):
+        self.interval = interval_ms / 1000
+        self.max_tokens = max_tokens
+        self.text = ""
+        self.pending: list[str] = []
+        self.last_flush = time.monotonic()
+        self.bytes_sent = 0
+        self.flushes = 0
+
+    def add(self, delta: str) -> bool:
+        """Buffer a delta, return True when it is time to flush."""
+        self.pending.append(delta)
+        return (
+            len(self.pending) >= self.max_tokens
+            or time.monotonic() - self.last_flush >= self.interval
+        )
+
+    def flush(self) -> str:
+        """Append the buffered deltas and return the full text to send."""
+        self.text += "".join(self.pending)
+        self.pending.clear()
+        self.last_flush = time.monotonic()
+        self.bytes_sent += len(self.text.encode("utf-8"))
+        self.flushes += 1
+        return self.text
+
+    def close(self, **labels) -> str:
+        """Flush what is left and record the metrics of the answer."""
+        if self.pending:
+            self.flush()
+        stream_bytes.observe(self.bytes_sent, **labels)
+        stream_flushes.observe(self.flushes, **labels)
+        return self.text
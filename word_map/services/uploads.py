@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+# Uploads are copied to disk in blocks of CHUNK_BYTES, never buffered whole.
+CHUNK_BYTES = int(os.environ.get("WORD_MAP_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_FILE_BYTES = int(os.environ.get("WORD_MAP_UPLOAD_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+MAX_SESSION_BYTES = int(os.environ.get("WORD_MAP_UPLOAD_MAX_SESSION_BYTES", str(200 * 1024 * 1024)))
+# Session directories untouched for this long are removed, as most sessions
+# end by closing the tab rather than by clearing their files.
+SESSION_TTL_S = int(os.environ.get("WORD_MAP_UPLOAD_SESSION_TTL_S", str(7 * 24 * 3600)))
+CLEANUP_INTERVAL_S = int(os.environ.get("WORD_MAP_UPLOAD_CLEANUP_INTERVAL_S", "3600"))
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class UploadTooLarge(ValueError):
+    """An upload exceeds the per-file or per-session quota."""
+
+
+def session_dir(upload_dir: Path, session_id: str) -> Path:
+    """Directory holding the uploads of one session only."""
+    return Path(upload_dir) / "sessions" / _UNSAFE_RE.sub("_", session_id)
+
+
+def safe_filename(name: str) -> str:
+    """Strip any directory part of a client-provided file name."""
+    name = Path(name.replace("\\", "/")).name
+    if not name or name in (".", ".."):
+        raise ValueError(f"Invalid file name: {name!r}")
+    return name
+
+
+def remove_session_dir(directory: Path):
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def remove_stale_sessions(upload_dir: Path, max_age_s: int = SESSION_TTL_S) -> int:
+    """Remove the session directories not modified for max_age_s, return how many."""
+    sessions = Path(upload_dir) / "sessions"
+    if not sessions.is_dir():
+        return 0
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for directory in sessions.iterdir():
+        try:
+            latest = max([directory.stat().st_mtime, *(path.stat().st_mtime for path in directory.iterdir())])
+        except OSError:
+            continue
+        if latest < cutoff:
+            remove_session_dir(directory)
+            removed += 1
+    return removed
+
+
+def stale_sessions_lifespan(upload_dir: Path):
+    """Lifespan task removing abandoned session directories periodically."""
+
+    @contextlib.asynccontextmanager
+    async def lifespan():
+        async def cleanup():
+            while True:
+                removed = await asyncio.to_thread(remove_stale_sessions, upload_dir)
+                if removed:
+                    logger.info("removed %d stale upload session directories", removed)
+                await asyncio.sleep(CLEANUP_INTERVAL_S)
+
+        task = asyncio.create_task(cleanup())
+        try:
+            yield
+        finally:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    return lifespan
+
+
+def _too_large(file, limit: int) -> str:
+    return f"{file.name} exceeds the upload limit ({max(limit, 0) / (1024 * 1024):.1f} MB available)."
+
+
+async def save_upload(file, destination: Path, limit: int = MAX_FILE_BYTES) -> tuple[str, int]:
+    """Stream an uploaded file to disk, return its SHA-256 and size.
+
+    Files announcing a size above ``limit`` are rejected before any copy,
+    others as soon as the copied bytes go over it. The content hash is
+    computed during the copy, so the file is never read twice.
+    """
+    if file.size is not None and file.size > limit:
+        raise UploadTooLarge(_too_large(file, limit))
+
+    digest = hashlib.sha256()
+    size = 0
+    partial = destination.with_name(f"{destination.name}.part")
+    file_object = await asyncio.to_thread(partial.open, "wb")
+    try:
+        while chunk := await file.read(CHUNK_BYTES):
+            size += len(chunk)
+            if size > limit:
+                raise UploadTooLarge(_too_large(file, limit))
+            digest.update(chunk)
+            await asyncio.to_thread(file_object.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(file_object.close)
+        partial.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(file_object.close)
+    # Only complete files ever appear under their final name.
+    os.replace(partial, destination)
+    return digest.hexdigest(), size
@@ -1,24 +1,96 @@
 import asyncio
-from dotenv import load_dotenv
-import fitz # PyMuPDF
+import contextlib
 import json
-import os
-import uuid
+import time
+from pathlib import Path
 
+import httpx
 import reflex as rx
-# from openai import OpenAI
-import openai
+
+from word_map.prompts import template_prompts_ddicts
+from word_map.style import DEFAULT_FONT_FAMILY
+from word_map.services.documents import PARSED, PENDING, ingest_document, ready_documents, register_document
+from word_map.services.compaction import compaction_range, needs_compaction, summarize_turns
+from word_map.services.hedging import HEDGE_BACKUP_MODEL, HEDGE_ENABLED, HedgedStream
+from word_map.services.llm import ChatStream, LLMError
+from word_map.services.response_cache import cache_key, cacheable, response_cache
+from word_map.services.messages import WINDOW_SIZE, Message, find_message, message_window
+from word_map.services.metrics import log_event, record_stage, record_tokens, span
+from word_map.services.models import DEFAULT_MODEL, MODEL_REGISTRY, estimate_cost, get_model_spec
+from word_map.services.prefetch import PREFETCH_ENABLED, cancel_prefetch, prefetch_answers
+from word_map.services.prompt import pack_prompt, request_params
+from word_map.services.resilience import ResilientStream, available_model, error_message, unavailable_models
+from word_map.services.retrieval import retrieve_passages
+from word_map.services.scheduler import QUEUE_POLL_S, QueueFull, scheduler
+from word_map.services.streaming import BATCH_FLUSH_INTERVAL_MS, BATCH_FLUSH_TOKENS, DeltaCoalescer
+from word_map.services.uploads import (
+    MAX_FILE_BYTES,
+    MAX_SESSION_BYTES,
+    UploadTooLarge,
+    remove_session_dir,
+    safe_filename,
+    save_upload,
+    session_dir,
+)
+
+
+async def _open_stream(model: str, plan, documents: dict[str, dict]):
+    """Stream of the answer to a packed prompt, and its response cache key.
+
+    Repeated questions on the same documents are served from the response
+    cache, others are streamed from the provider as they are generated.
+    """
+    params = request_params(plan)
+    key = None
+    stream = None
+    if cacheable(params):
+        key = cache_key(
+            model,
+            plan.messages,
+            [document["sha256"] for document in documents.values()],
+            params,
+        )
+        stream = await response_cache.get(key)
+    if stream is None:
+        # Transient errors are retried until the first token
+        stream = ResilientStream(ChatStream(model, messages=plan.messages, **params))
+        # Race a backup model when the selected one is slow to start answering
+        if HEDGE_ENABLED and HEDGE_BACKUP_MODEL != model:
+            stream = HedgedStream(
+                stream, ResilientStream(ChatStream(HEDGE_BACKUP_MODEL, messages=plan.messages, **params))
+            )
+    return stream, key
+
+
+def _record_answer(model: str, stream, plan, ticket):
+    """Log the token usage of a finished answer, usage comes with the last chunk."""
+    # Priced as the model that answered, which a fallback or a hedge may have changed.
+    spec = MODEL_REGISTRY.get(stream.model) or get_model_spec(model)
+    record_tokens(
+        model,
+        stream.nb_input_tokens,
+        stream.nb_output_tokens,
+        cost_usd=0.0 if stream.cached else estimate_cost(spec, stream.nb_input_tokens, stream.nb_output_tokens),
+        served_model=stream.model,
+        nb_cached_tokens=stream.nb_cached_tokens,
+        response_cached=stream.cached,
+        queue_wait_s=round(ticket.waited_s, 3) if ticket is not None else 0.0,
+        allocation=plan.allocation,
+    )
+
 
 class SettingsState(rx.State):
     # The accent color for the app
     color: str = "violet"
 
     # The font family for the app
-    font_family: str = "Poppins"
+    font_family: str = DEFAULT_FONT_FAMILY
 
 
 class ModelSelectionMixin(rx.State, mixin=True):
-    llm_engine: str = "google/gemma-3n-e4b-it:free"
+    llm_engine: str = DEFAULT_MODEL
+    # Models set aside by their circuit breaker, greyed out in the selector.
+    unavailable_models: list[str] = []
 
     @rx.event
     def change_value(self, llm: str):
@@ -32,6 +104,14 @@ class UploadState(rx.State):
     # The documents to list
     rag_document: list[str] = []
     all_uploaded_files: list[str] = []
+    # Parsing status of each document ("pending", "parsed" or "failed").
+    rag_status: dict[str, str] = {}
+    # Registry of the ingested documents of this session, keyed by file name.
+    _documents: dict[str, dict] = {}
+
+    def _session_upload_dir(self) -> Path:
+        """Upload directory of this session, other sessions never see its files."""
+        return session_dir(rx.get_upload_dir(), self.router.session.client_token)
 
     @rx.event
     async def handle_upload(self, files: list[rx.UploadFile]):
@@ -40,18 +120,68 @@ class UploadState(rx.State):
         Args:
             files: The uploaded files.
         """
+        events = []
+        # Answers prefetched for the previous documents are no longer wanted.
+        await cancel_prefetch(self.router.session.client_token)
+        upload_dir = self._session_upload_dir()
+        await asyncio.to_thread(upload_dir.mkdir, parents=True, exist_ok=True)
         for file in files:
-            upload_data = await file.read()
-            outfile = rx.get_upload_dir() / file.name
+            try:
+                name = safe_filename(file.name or "")
+            except ValueError as error:
+                events.append(rx.toast.error(str(error)))
+                continue
+            outfile = upload_dir / name
+
+            # Bytes left in the session quota, a re-uploaded file replaces the previous one.
+            session_bytes = sum(
+                document["size"] for other, document in self._documents.items() if other != name
+            )
+            limit = min(MAX_FILE_BYTES, MAX_SESSION_BYTES - session_bytes)
 
-            # Save the file.
-            with outfile.open("wb") as file_object:
-                file_object.write(upload_data)
+            # Stream the file to disk, hashing it on the way.
+            try:
+                with span("upload"):
+                    sha256, size = await save_upload(file, outfile, limit)
+            except UploadTooLarge as error:
+                events.append(rx.toast.error(str(error)))
+                continue
 
-            # Update the rag_document var.
-            self.rag_document.append(file.name)
-        self.all_uploaded_files = [f for f in os.listdir(rx.get_upload_dir())]
+            # Register the document, it is parsed in the background.
+            self._documents[name] = register_document(outfile, name, sha256, size)
+            self.rag_status[name] = PENDING
 
+            # Update the rag_document var.
+            if name not in self.rag_document:
+                self.rag_document.append(name)
+        self.all_uploaded_files = sorted(self._documents)
+        return [*events, UploadState.ingest_pending_documents]
+
+    @rx.event(background=True)
+    async def ingest_pending_documents(self):
+        """Parse the pending documents without blocking the session."""
+        async with self:
+            pending = [dict(record) for record in self._documents.values() if record["status"] == PENDING]
+
+        for ingestion in asyncio.as_completed([ingest_document(record) for record in pending]):
+            record = await ingestion
+            async with self:
+                # Skip documents removed or replaced while they were parsed.
+                current = self._documents.get(record["name"])
+                if current is None or current["sha256"] != record["sha256"]:
+                    continue
+                self._documents[record["name"]] = record
+                self.rag_status[record["name"]] = record["status"]
+
+        # Answer the template prompts ahead of the user once every document is parsed
+        if not (PREFETCH_ENABLED and pending):
+            return
+        async with self:
+            # Documents may have been removed, or others uploaded, meanwhile.
+            documents = self._documents.values()
+            ready = bool(documents) and all(record["status"] != PENDING for record in documents)
+        if ready:
+            return State.prefetch_templates
 
     @rx.event
     def cancel_upload(self):
@@ -59,169 +189,423 @@ class UploadState(rx.State):
         return rx.cancel_upload("upload1")
     
     @rx.event
-    def clear_all_uploaded_files(self):
-        for f in os.listdir(rx.get_upload_dir()):
-            os.remove(rx.get_upload_dir() / f)
+    async def clear_all_uploaded_files(self):
+        await cancel_prefetch(self.router.session.client_token)
+        # Only the files of this session are removed.
+        await asyncio.to_thread(remove_session_dir, self._session_upload_dir())
         self.all_uploaded_files = []
+        self._documents.clear()
+        self.rag_status = {}
         self.rag_document.clear()
         return rx.cancel_upload("upload1")
 
 
-# Load environment variables
-load_dotenv(".env")
-# AsyncOpenAI not supported by OpenRouter
-client = openai.OpenAI(
-    base_url="https://openrouter.ai/api/v1",
-    api_key=os.environ.get("OPENROUTER_API_KEY"),
-    )
-
-
 class State(ModelSelectionMixin, rx.State):
     """General App State."""
     # The current question being asked.
     question: str
     # Whether the app is processing a question.
     processing: bool = False
-    # Keep track of the chat history as a list of (question, answer, model, nb_input_tokens, nb_output_tokens) tuples.
-    chat_history: list[tuple[str, str, str, int, int]] = []
+    # The chat, one record per question, kept on the backend.
+    _messages: list[Message] = []
+    _next_message_id: int = 0
+    # The last window_size messages as (id, question, answer, model, nb_input_tokens, nb_output_tokens, cached, nb_cached_tokens) tuples.
+    # Only this window is sent to the client, so an update costs the same whatever the length of the chat.
+    chat_window: list[tuple[int, str, str, str, int, int, bool, int]] = []
+    window_size: int = WINDOW_SIZE
+    nb_messages: int = 0
     # Keep history of messages for continuity between follow-up prompts
     messages_history: list[tuple[str, str]] = []
-    user_id: str = str(uuid.uuid4())
+    # Key of the per-user concurrency limit, set on the first question.
+    user_id: str = ""
+    # Place in the LLM queue and seconds waited so far, 0 when not queued.
+    queue_position: int = 0
+    queue_wait_s: int = 0
 
     query_engine: str
     nb_input_tokens: int
     nb_output_tokens: int
-    rag_input: list[dict] = []
-
-
-    # Extract text from all pages of a PDF and return it in one chunk
-    def extract_text_from_pdf(self, pdf_bytes):
-        pdf_doc = fitz.open(pdf_bytes)
-        text = ""
-        for page_num in range(pdf_doc.page_count):
-            page = pdf_doc.load_page(page_num)
-            text += page.get_text("text")
-        
-        self.rag_input.append({'pdf_doc': pdf_bytes, 'pdf_text': text})
-
-    def query_pdf(self):#, query: str, model_engine: str):
-        for pdf_doc in os.listdir("./uploaded_files"):
-            self.extract_text_from_pdf(f"./uploaded_files/{pdf_doc}")
-
+    nb_cached_tokens: int
+    # The answer being streamed, sent on its own so that the whole chat
+    # history is not re-sent to the client on every update.
+    current_answer: str = ""
+    # Id of the message read from current_answer, -1 when none is.
+    streaming_id: int = -1
+    # Completed (question, answer) turns, appended one at a time.
+    _turns: list[tuple[str, str]] = []
+    # Running summary of the first _summary_turns turns, built in the background.
+    _summary: str = ""
+    _summary_turns: int = 0
+    _compacting: bool = False
+    # Bumped when the chat is cleared, so a late summary is thrown away.
+    _history_epoch: int = 0
+
+    def _sync_window(self):
+        self.nb_messages = len(self._messages)
+        self.chat_window = message_window(self._messages, self.window_size)
+
+    def _add_message(self, question: str) -> int:
+        message_id = self._next_message_id
+        self._next_message_id += 1
+        self._messages.append(Message(message_id, question))
+        self._sync_window()
+        return message_id
+
+    def _update_message(self, message_id: int, **fields):
+        """Change a message, re-sending the window only if it shows the message."""
+        message = find_message(self._messages, message_id)
+        if message is None:
+            return
+        for name, value in fields.items():
+            setattr(message, name, value)
+        if message_id >= self._messages[-min(self.window_size, len(self._messages))].id:
+            self._sync_window()
 
     @rx.event
-    async def answer(self, model): #, *args, **kwargs):
-        model = self.llm_engine
-        # Set the processing state to True.
-        self.processing = True
-        yield
-
-        # Convert chat history to a list of dictionaries
-        chat_history_dicts = []
-        messages_history = []
-        for chat_history_tuple in self.chat_history:
-            chat_history_dicts.append(
-                {"role": "user", "content": chat_history_tuple[0]}
-            )
-            chat_history_dicts.append(
-                {"role": "assistant", "content": chat_history_tuple[1]}
-            )
-            chat_history_dicts.append(
-                {"model": chat_history_tuple[2]}
-            )
-            chat_history_dicts.append(
-                {"nb_input_tokens": chat_history_tuple[3]}
-            )
-            chat_history_dicts.append(
-                {"nb_output_tokens": chat_history_tuple[4]}
-            )
-            # Build up current message on the basis of all previous messages
-            messages_history.append(
-                {"role": "user", "content": chat_history_tuple[0]}
-            )
-            messages_history.append(
-                {"role": "assistant", "content": chat_history_tuple[1]}
-            )
-
-        self.chat_history.append((self.question, "", "", 0, 0))
-
-        # Clear the question input.
-        question = self.question
-        self.question = ""
-        # Yield here to clear the frontend input before continuing.
-        yield
-
-        messages_history.append({"role": "assistant", "content": question})
-
-        # Ingest PDF text
-        self.query_pdf()
-
-
-        # Synchronous OpenAI call in an async handler
-        def get_openai_response():
-            response = client.chat.completions.create(
-                model= model,
-                messages=[
-                {
-                    "role": "user",
-                    "content": f"{self.rag_input} All preceding content, if any, is PROMPT_CONTEXT. Use PROMPT_CONTEXT to help yourself answer user prompts. {messages_history}.",
-                }
-            ], 
-            # max_tokens=150,
-            temperature=0.0,
-            top_p=0.1,
-            # max_tokens=512,
-            stream=False,
+    def show_earlier(self):
+        """Send older messages of the chat to the client."""
+        self.window_size += WINDOW_SIZE
+        self._sync_window()
+
+    @rx.event(background=True)
+    async def answer(self, model=None): #, *args, **kwargs):
+        """Answer the question of the input box, streaming into a new chat entry.
+
+        A background event, so that the session lock is only held while the
+        state is written: with the state in Redis, the lock expires long
+        before a queued or slow answer is complete.
+        """
+        async with self:
+            if self.processing:
+                return
+            # Fall back to another model while the selected one is set aside
+            self.unavailable_models = unavailable_models()
+            model = available_model(self.llm_engine, MODEL_REGISTRY)
+            # Set the processing state to True.
+            self.processing = True
+            message_id = self._add_message(self.question)
+            self.streaming_id = message_id
+            self.current_answer = ""
+            # Clear the question input.
+            question = self.question
+            self.question = ""
+            epoch = self._history_epoch
+            turns, summary = list(self._turns[self._summary_turns :]), self._summary
+            self.user_id = self.user_id or self.router.session.client_token
+            user_id, session_id = self.user_id, self.router.session.client_token
+            upload_state = await self.get_state(UploadState)
+            registry = dict(upload_state._documents)
+
+        compact = False
+        try:
+            # Retrieve the passages of the uploaded documents relevant to the question,
+            # waiting only for the documents that are still being parsed
+            with span("extract", model=model):
+                documents = await ready_documents(registry)
+            # Indexing and embedding a new document takes seconds: off the event loop.
+            with span("retrieve", model=model):
+                passages, stable_passages = await asyncio.to_thread(retrieve_passages, session_id, documents, question)
+
+            # Fit instructions, question, passages and history in the model's context window
+            with span("prompt", model=model):
+                plan = pack_prompt(get_model_spec(model), question, passages, turns, summary, stable_passages)
+            stream, key = await _open_stream(model, plan, documents)
+            coalescer = DeltaCoalescer()
+            ticket = None
+            if not stream.cached:
+                # Wait for an LLM slot, showing the place in the queue meanwhile
+                try:
+                    ticket = scheduler.submit(user_id)
+                except QueueFull as error:
+                    async with self:
+                        if epoch == self._history_epoch:
+                            self._update_message(message_id, answer=str(error))
+                            self.streaming_id = -1
+                            self.processing = False
+                    return
+            try:
+                while ticket is not None and not ticket.granted.done():
+                    async with self:
+                        # The chat was cleared meanwhile, the answer is no longer wanted.
+                        if epoch != self._history_epoch:
+                            return
+                        self.queue_position = scheduler.position(ticket)
+                        self.queue_wait_s = int(ticket.waited_s)
+                    await asyncio.wait({ticket.granted}, timeout=QUEUE_POLL_S)
+                async with self:
+                    self.queue_position = 0
+                    self.queue_wait_s = 0
+
+                llm_start = time.perf_counter()
+                first_token = None
+                flush_seconds = 0.0
+                # Closed explicitly, so that leaving early releases the connection.
+                async with contextlib.aclosing(aiter(stream)) as deltas:
+                    async for delta in deltas:
+                        if first_token is None:
+                            first_token = time.perf_counter()
+                            record_stage("llm_ttft", first_token - llm_start, model=model)
+                        # Buffer the deltas and send them in batches.
+                        if coalescer.add(delta):
+                            flush_start = time.perf_counter()
+                            async with self:
+                                if epoch != self._history_epoch:
+                                    return
+                                self.current_answer = coalescer.flush()
+                            flush_seconds += time.perf_counter() - flush_start
+                record_stage("llm_total", time.perf_counter() - llm_start - flush_seconds, model=model)
+                record_stage("stream_flush", flush_seconds, model=model)
+            except (LLMError, httpx.HTTPError) as error:
+                log_event("llm_error", model=model, error=str(error)[:500], status_code=getattr(error, "status_code", None))
+                # Keep what was streamed, tell why the answer stops there
+                partial = coalescer.close(model=model)
+                message = f"{partial}\n\n*{error_message(error)}*" if partial else error_message(error)
+                async with self:
+                    self.queue_position = 0
+                    self.unavailable_models = unavailable_models()
+                    if epoch == self._history_epoch:
+                        self._update_message(message_id, answer=message, model=model)
+                        self.current_answer = ""
+                        self.streaming_id = -1
+                        self.processing = False
+                return
+            finally:
+                if ticket is not None:
+                    scheduler.release(ticket)
+            answer = coalescer.close(model=model)
+
+            _record_answer(model, stream, plan, ticket)
+
+            async with self:
+                self.unavailable_models = unavailable_models()
+                if epoch != self._history_epoch:
+                    return
+                # Extract other elements from the response, usage comes with the last chunk
+                self.query_engine = stream.model
+                self.nb_input_tokens = stream.nb_input_tokens
+                self.nb_output_tokens = stream.nb_output_tokens
+                self.nb_cached_tokens = stream.nb_cached_tokens
+                self._update_message(
+                    message_id,
+                    answer=answer,
+                    model=stream.model,
+                    nb_input_tokens=stream.nb_input_tokens,
+                    nb_output_tokens=stream.nb_output_tokens,
+                    cached=stream.cached,
+                    nb_cached_tokens=stream.nb_cached_tokens,
+                )
+                self.current_answer = ""
+                self.streaming_id = -1
+                self._turns.append((question, answer))
+                # Set the processing state to False.
+                self.processing = False
+                compact = needs_compaction(len(self._turns), self._summary_turns)
+
+            if key is not None and not stream.cached:
+                await response_cache.put(key, stream.model, answer, stream.nb_input_tokens, stream.nb_output_tokens)
+        except Exception as error:
+            # Any other failure (cache, documents, retrieval) still ends the answer with a message.
+            log_event("answer_error", model=model, error=repr(error)[:500])
+            async with self:
+                if epoch == self._history_epoch and self.streaming_id == message_id:
+                    partial = self.current_answer
+                    message = f"{partial}\n\n*{error_message(error)}*" if partial else error_message(error)
+                    self._update_message(message_id, answer=message, model=model)
+        finally:
+            async with self:
+                # Still marked as streaming: the answer stopped before its last write.
+                if epoch == self._history_epoch and self.streaming_id == message_id:
+                    self.current_answer = ""
+                    self.streaming_id = -1
+                    self.queue_position = 0
+                    self.queue_wait_s = 0
+                    self.processing = False
+
+        # Fold older turns into the running summary once the history grows long
+        if compact:
+            yield State.compact_history
+
+    @rx.event(background=True)
+    async def answer_all(self):
+        """Run every template prompt at once, each into its own chat entry.
+
+        Documents are parsed and indexed once, and the prompts share the
+        same history, so all requests start at the same time from the same
+        context and the batch takes about as long as its slowest answer.
+        """
+        async with self:
+            if self.processing:
+                return
+            self.processing = True
+            self.unavailable_models = unavailable_models()
+            model = available_model(self.llm_engine, MODEL_REGISTRY)
+            self.user_id = self.user_id or self.router.session.client_token
+            questions = [template["description"] for template in template_prompts_ddicts.values()]
+            message_ids = [self._add_message(question) for question in questions]
+            epoch = self._history_epoch
+            turns, summary = list(self._turns[self._summary_turns :]), self._summary
+            session_id = self.router.session.client_token
+            upload_state = await self.get_state(UploadState)
+            registry = dict(upload_state._documents)
+
+        compact = False
+        try:
+            batch_start = time.perf_counter()
+            with span("extract", model=model):
+                documents = await ready_documents(registry)
+            spec = get_model_spec(model)
+            plans = []
+            for question in questions:
+                with span("retrieve", model=model):
+                    passages, stable_passages = await asyncio.to_thread(retrieve_passages, session_id, documents, question)
+                with span("prompt", model=model):
+                    plans.append(pack_prompt(spec, question, passages, turns, summary, stable_passages))
+
+            answers = await asyncio.gather(
+                *[
+                    self._answer_entry(message_id, epoch, model, plan, documents)
+                    for message_id, plan in zip(message_ids, plans)
+                ]
             )
-            return response #.choices[0].message.content
-        
-        loop = asyncio.get_event_loop()
-        raw_answer = await loop.run_in_executor(None, get_openai_response) # response.choices[0].message.content
-        answer = raw_answer.choices[0].message.content
-        # Extract other elements from the response
-        query_engine = raw_answer.model
-        self.query_engine = query_engine
-        nb_input_tokens = raw_answer.usage.prompt_tokens
-        self.nb_input_tokens = nb_input_tokens
-        nb_output_tokens = raw_answer.usage.completion_tokens
-        self.nb_output_tokens = nb_output_tokens
-
-
-        for i in range(len(answer)):
-            # Pause to show the streaming effect.
-            await asyncio.sleep(0.01)
-            # Add one letter at a time to the output.
-            self.chat_history[-1] = (
-                self.chat_history[-1][0],
-                answer[: i + 1],
+            record_stage("batch_total", time.perf_counter() - batch_start, model=model)
+
+            async with self:
+                if epoch != self._history_epoch:
+                    return
+                self._turns.extend(
+                    (question, answer) for question, answer in zip(questions, answers) if answer is not None
+                )
+                compact = needs_compaction(len(self._turns), self._summary_turns)
+        except Exception as error:
+            # Failed before the entries were answered: say so in those still empty.
+            log_event("answer_error", model=model, error=repr(error)[:500])
+            async with self:
+                if epoch == self._history_epoch:
+                    for message_id in message_ids:
+                        message = find_message(self._messages, message_id)
+                        if message is not None and not message.answer:
+                            self._update_message(message_id, answer=error_message(error), model=model)
+        finally:
+            async with self:
+                self.unavailable_models = unavailable_models()
+                # After a clear, processing belongs to whatever answer came next.
+                if epoch == self._history_epoch:
+                    self.processing = False
+        if compact:
+            yield State.compact_history
+
+    async def _answer_entry(self, message_id: int, epoch: int, model: str, plan, documents: dict[str, dict]) -> str | None:
+        """Stream one answer of a batch into its chat entry, return it if complete."""
+        coalescer = DeltaCoalescer(BATCH_FLUSH_INTERVAL_MS, BATCH_FLUSH_TOKENS)
+        ticket = None
+        try:
+            stream, key = await _open_stream(model, plan, documents)
+            slot = contextlib.nullcontext() if stream.cached else scheduler.slot(self.user_id)
+            async with slot as ticket:
+                llm_start = time.perf_counter()
+                # Closed explicitly, so that leaving early releases the connection.
+                async with contextlib.aclosing(aiter(stream)) as deltas:
+                    async for delta in deltas:
+                        # Every write sends the whole history, so batch entries flush less often.
+                        if coalescer.add(delta):
+                            text = coalescer.flush()
+                            async with self:
+                                if epoch != self._history_epoch:
+                                    return None
+                                self._update_message(message_id, answer=text, model=model)
+                record_stage("llm_total", time.perf_counter() - llm_start, model=model)
+        except Exception as error:
+            # Any failure only ends this entry, the other answers of the batch go on.
+            if isinstance(error, (LLMError, httpx.HTTPError, QueueFull)):
+                log_event("llm_error", model=model, error=str(error)[:500], status_code=getattr(error, "status_code", None))
+            else:
+                log_event("answer_error", model=model, error=repr(error)[:500])
+            partial = coalescer.close(model=model)
+            message = f"{partial}\n\n*{error_message(error)}*" if partial else error_message(error)
+            async with self:
+                if epoch == self._history_epoch:
+                    self._update_message(message_id, answer=message, model=model)
+            return None
+        answer = coalescer.close(model=model)
+        _record_answer(model, stream, plan, ticket)
+
+        async with self:
+            if epoch != self._history_epoch:
+                return None
+            self._update_message(
+                message_id,
+                answer=answer,
+                model=stream.model,
+                nb_input_tokens=stream.nb_input_tokens,
+                nb_output_tokens=stream.nb_output_tokens,
+                cached=stream.cached,
+                nb_cached_tokens=stream.nb_cached_tokens,
             )
-            yield
-
-        self.chat_history[-1] = (self.chat_history[-1][0], answer, query_engine, nb_input_tokens, nb_output_tokens)
-        
-        # Add to the answer as the chatbot responds.
-        answer = ""
-        yield
-
-        # Ensure the final answer is added to chat history
-        if answer:
-            self.chat_history[-1] = (self.chat_history[-1][0], answer, query_engine, nb_input_tokens, nb_output_tokens)
-            yield
-
-
-        # Set the processing state to False.
-        self.processing = False
+        if key is not None and not stream.cached:
+            await response_cache.put(key, stream.model, answer, stream.nb_input_tokens, stream.nb_output_tokens)
+        return answer
+
+    @rx.event(background=True)
+    async def prefetch_templates(self):
+        """Answer the template prompts of the landing view into the response cache."""
+        async with self:
+            # The cards are only shown, hence only worth prefetching, on an empty chat.
+            if self._messages:
+                return
+            model = available_model(self.llm_engine, MODEL_REGISTRY)
+            user_id = self.user_id = self.user_id or self.router.session.client_token
+            session_id = self.router.session.client_token
+            upload_state = await self.get_state(UploadState)
+            documents = {
+                name: dict(record) for name, record in upload_state._documents.items() if record["status"] == PARSED
+            }
+        if documents:
+            questions = [template["description"] for template in template_prompts_ddicts.values()]
+            await prefetch_answers(session_id, user_id, model, documents, questions)
+
+    @rx.event(background=True)
+    async def compact_history(self):
+        """Replace older turns with a running summary, off the answer path."""
+        async with self:
+            if self._compacting or not needs_compaction(len(self._turns), self._summary_turns):
+                return
+            self._compacting = True
+            epoch = self._history_epoch
+            start, end = compaction_range(len(self._turns), self._summary_turns)
+            summary, turns, model = self._summary, list(self._turns[start:end]), self.llm_engine
+            user_id = self.user_id or self.router.session.client_token
+
+        try:
+            async with scheduler.slot(user_id):
+                new_summary = await summarize_turns(model, summary, turns)
+        except (LLMError, httpx.HTTPError, QueueFull):
+            new_summary = ""
+
+        async with self:
+            self._compacting = False
+            if new_summary and epoch == self._history_epoch and self._summary_turns == start:
+                self._summary = new_summary
+                self._summary_turns = end
 
-        
     async def handle_key_down(self, key: str):
         if key == "Enter":
-            async for t in self.answer():
-                yield t
+            return State.answer
 
     @rx.event
     def clear_chat(self):
         # Reset the chat history and processing state
-        self.chat_history = []
+        self._messages = []
+        self.window_size = WINDOW_SIZE
+        self._sync_window()
+        self.streaming_id = -1
+        # An answer still queued or streaming stops on the new epoch without touching these.
+        self.current_answer = ""
+        self.queue_position = 0
+        self.queue_wait_s = 0
+        self._turns = []
+        self._summary = ""
+        self._summary_turns = 0
+        self._history_epoch += 1
         self.processing = False
         yield
 
@@ -1,9 +1,37 @@
 # style.py
 from reflex.constants.colors import ColorType
 
-STYLESHEETS = [
-    "https://fonts.googleapis.com/css2?family=Instrument+Sans:ital,wght@0,400;0,500;0,600;0,700;1,400;1,500;1,600;1,700&family=Poppins:ital,wght@0,400;0,500;0,600;0,700;1,400;1,500;1,600;1,700&family=Inter:wght@400;500;600;700&family=Roboto:ital,wght@0,400;0,500;0,700;1,400;1,500;1,700&family=Open+Sans:ital,wght@0,400;0,600;0,700;1,400;1,600;1,700&family=Lato:ital,wght@0,400;0,700;1,400;1,700&display=swap"
-]
+# Fonts are self-hosted from assets/fonts, see scripts/subset_fonts.py.
+STYLESHEETS = []
+
+# Families of the font picker, with the weights and styles bundled for each.
+FONT_FAMILIES = {
+    "Instrument Sans": {"weights": (400, 500, 600, 700), "italic": True},
+    "Poppins": {"weights": (400, 500, 600, 700), "italic": True},
+    "Inter": {"weights": (400, 500, 600, 700), "italic": False},
+    "Lato": {"weights": (400, 700), "italic": True},
+    "Roboto": {"weights": (400, 500, 700), "italic": True},
+    "Open Sans": {"weights": (400, 600, 700), "italic": True},
+}
+# Served from /fonts, as assets/ is the root of the static files.
+FONTS_DIR = "fonts"
+# Family of a new session, the only one linked and preloaded in the page head.
+DEFAULT_FONT_FAMILY = "Poppins"
+
+
+def font_slug(family):
+    """File name prefix of a family, works on str and on a state var."""
+    return family.lower().replace(" ", "-")
+
+
+def font_stylesheet(family) -> str:
+    """The @font-face rules of a family; faces only download once used."""
+    return f"/{FONTS_DIR}/{font_slug(family)}.css"
+
+
+def font_preload(family) -> str:
+    """The face of a family needed for the first paint: regular, Latin."""
+    return f"/{FONTS_DIR}/{font_slug(family)}-400-latin.woff2"
 
 
 # Default Radix Colors
@@ -2,9 +2,11 @@ import os
 import reflex as rx
 from word_map.components.badge import made_with_reflex
 from word_map.state import State, UploadState #, ModelSelectionMixin #, ManualRAGState
+from word_map.services.models import MODEL_REGISTRY
+from word_map.services.uploads import MAX_FILE_BYTES
 
 
-def qa(question: str, answer: str, model: str, nb_input_tokens: int, nb_output_tokens: int) -> rx.Component:
+def qa(question: str, answer: str, model: str, nb_input_tokens: int, nb_output_tokens: int, cached: bool, nb_cached_tokens: int) -> rx.Component:
     return rx.box(
         # Question
         rx.box(
@@ -18,6 +20,7 @@ def qa(question: str, answer: str, model: str, nb_input_tokens: int, nb_output_t
         rx.box(
             rx.vstack(
                 rx.badge(model),
+                rx.cond(cached, rx.badge("cached", color_scheme="gray")),
                 rx.box(
                     rx.image(
                         src="word_map.png",
@@ -32,7 +35,7 @@ def qa(question: str, answer: str, model: str, nb_input_tokens: int, nb_output_t
                 ),
                 rx.box(
                     rx.hstack(
-                        rx.badge(f"Input tokens = {nb_input_tokens}. Output tokens = {nb_output_tokens} "),
+                        rx.badge(f"Input tokens = {nb_input_tokens} ({nb_cached_tokens} cached). Output tokens = {nb_output_tokens} "),
                         rx.el.button(
                             rx.icon(tag="copy", size=18),
                             class_name="p-1 text-slate-10 hover:text-slate-11 transform transition-colors cursor-pointer",
@@ -47,15 +50,50 @@ def qa(question: str, answer: str, model: str, nb_input_tokens: int, nb_output_t
             class_name="flex flex-row gap-6",
         ),
         class_name="flex flex-col gap-8 pb-10 group",
+        # Bubbles out of view are neither laid out nor painted.
+        style={"content_visibility": "auto", "contain_intrinsic_size": "auto 240px"},
     )
 
 
 def chat() -> rx.Component:
     """A chat in the style of text messages."""
     return rx.scroll_area(
+        # Only the last messages are mounted, older ones are fetched on demand.
+        rx.cond(
+            State.nb_messages > State.chat_window.length(),
+            rx.center(
+                rx.button(
+                    "Show earlier messages",
+                    on_click=State.show_earlier,
+                    variant="ghost",
+                    size="1",
+                ),
+                class_name="pb-6",
+            ),
+        ),
         rx.foreach(
-            State.chat_history,
-            lambda messages: qa(messages[0], messages[1], messages[2], messages[3], messages[4]),
+            State.chat_window,
+            lambda message: qa(
+                message[1],
+                # The answer being streamed is read from current_answer.
+                rx.cond(
+                    message[0] == State.streaming_id,
+                    State.current_answer,
+                    message[2],
+                ),
+                message[3],
+                message[4],
+                message[5],
+                message[6],
+                message[7],
+            ),
+        ),
+        rx.cond(
+            State.queue_position > 0,
+            rx.badge(
+                f"Waiting for the model: position {State.queue_position} in the queue ({State.queue_wait_s} s)",
+                color_scheme="gray",
+            ),
         ),
         scrollbars="vertical",
         class_name="w-full",
@@ -63,8 +101,17 @@ def chat() -> rx.Component:
 
 def select_llm_engine() -> rx.Component:
     return rx.center(
-        rx.select(
-            ["google/gemma-3n-e4b-it:free", "openai/gpt-3.5-turbo", "deepseek/deepseek-r1-0528:free", "qwen/qwen3-coder:free", "mistralai/mistral-small-3.2-24b-instruct:free"],
+        rx.select.root(
+            rx.select.trigger(),
+            rx.select.content(
+                rx.select.group(
+                    *[
+                        # Models whose circuit breaker is open cannot be picked.
+                        rx.select.item(name, value=name, disabled=State.unavailable_models.contains(name))
+                        for name in MODEL_REGISTRY
+                    ],
+                ),
+            ),
             value=State.llm_engine,
             on_change=State.change_value,
         ),
@@ -88,6 +135,8 @@ def rag_input() -> rx.Component:
                     "Select File(s) for Context (RAG)",
                 ),
                 multiple=True,
+                # Oversized files are rejected by the browser, before any upload.
+                max_size=MAX_FILE_BYTES,
                 id="upload1",
                 class_name="left-2 relative bg-accent-9 hover:bg-accent-10 disabled:hover:bg-accent-9 opacity-85 disabled:opacity-50 p-1.5 rounded-full transition-colors -translate-y-1/2 cursor-pointer disabled:cursor-default",
             ),
@@ -107,7 +156,17 @@ def rag_input() -> rx.Component:
         rx.hstack(
             rx.foreach(
                 UploadState.rag_document,
-                lambda rag_document: rx.badge(rag_document, direction="row"),
+                lambda rag_document: rx.badge(
+                    rag_document,
+                    # Parsing status of the document
+                    rx.match(
+                        UploadState.rag_status[rag_document],
+                        ("parsed", rx.icon(tag="check", size=12)),
+                        ("failed", rx.icon(tag="triangle-alert", size=12)),
+                        rx.spinner(size="1"),
+                    ),
+                    direction="row",
+                ),
             ),
             padding="1em",
         ),
@@ -128,7 +187,7 @@ def rag_input() -> rx.Component:
         #     #     lambda f: rx.badge(f),
         #     # )
         # ),
-        display=rx.cond(State.chat_history, "none", "flex"),
+        display=rx.cond(State.nb_messages > 0, "none", "flex"),
         # padding="5em",
     )
 
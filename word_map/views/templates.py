@@ -1,25 +1,7 @@
 import reflex as rx
+from word_map.prompts import template_prompts_ddicts
 from word_map.state import State
 
-template_prompts_ddicts = {
-    "jobs": {"icon": "route",
-             "title": "Get all job positions",
-             "description": "Make a list of all the people mentioned and their past and current places of employment. Your output should be a table with the people's first and last name as column titles, and each employment place as a cell under the respective names",
-    },
-    "countries": {"icon": "earth",
-                  "title": "Map countries of employment",
-                  "description": "Plot a world map and place a pin on each country where the people mentioned worked, with the pin label being the first and last names of the person in question",
-    },
-    "skills": {"icon": "brain-circuit",
-               "title": "List skills",
-               "description": "Make a table with every skill mentioned as the first cell in each row and the names of each person mentioned as the title of a different column. Then add a cross in every cell corresponding to the person and relevant skill. Make sure that the cross is centred horizontally in every column",
-    },
-    "languages": {"icon": "languages",
-                  "title": "Show all languages",
-                  "description": "For every person mentioned, write their first name, last name, and draw next to these the flags corresponding to every language they mention in their language skills",
-    }
-}
-
 def template_card(icon: str, title: str, description: str, color: str) -> rx.Component:
     return rx.el.button(
         rx.icon(tag=icon, color=rx.color(color, 9), size=32),
@@ -71,10 +53,17 @@ def templates() -> rx.Component:
             ),
             class_name="gap-4 grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 w-full",
         ),
+        rx.button(
+            rx.icon(tag="layers", size=16),
+            "Run all",
+            on_click=State.answer_all,
+            disabled=State.processing,
+            variant="soft",
+        ),
         class_name="top-1/3 left-1/2 absolute flex flex-col justify-center items-center gap-10 w-full max-w-4xl transform -translate-x-1/2 -translate-y-1/2 px-6 z-50",
         style={
             "animation": "reveal 0.35s ease-out",
             "@keyframes reveal": {"0%": {"opacity": "0"}, "100%": {"opacity": "1"}},
         },
-        display=rx.cond(State.chat_history, "none", "flex"),
+        display=rx.cond(State.nb_messages > 0, "none", "flex"),
     )
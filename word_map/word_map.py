@@ -1,3 +1,6 @@
+import logging
+import os
+
 import reflex as rx
 
 from word_map import style
@@ -6,6 +9,13 @@ from word_map.components.settings import settings_icon
 from word_map.components.reset import reset
 from word_map.views.templates import templates
 from word_map.views.chat import chat, action_bar #, rag_input
+from word_map.services.api import api_transformers
+from word_map.services.extraction import process_pool_lifespan
+from word_map.services.llm import http_client_lifespan
+from word_map.services.uploads import stale_sessions_lifespan
+
+# Structured stage and usage logs, see word_map/services/metrics.py
+logging.basicConfig(level=os.environ.get("WORD_MAP_LOG_LEVEL", "INFO"))
 
 # def custom_backend_handler(exception: Exception):
 #     return State.clear_chat()  # Triggers the frontend reset
@@ -23,6 +33,12 @@ def index() -> rx.Component:
             }}
         """
         ),
+        # The default family is linked in the page head; another one is only
+        # fetched once selected, see word_map/style.py.
+        rx.cond(
+            SettingsState.font_family != style.DEFAULT_FONT_FAMILY,
+            rx.el.link(rel="stylesheet", href=style.font_stylesheet(SettingsState.font_family)),
+        ),
         # Top bar with the reset and settings buttons
         rx.box(
             reset(),
@@ -43,7 +59,27 @@ def index() -> rx.Component:
     )
 
 
-app = rx.App(stylesheets=style.STYLESHEETS, style={"font_family": "var(--font-family)"})
+app = rx.App(
+    stylesheets=style.STYLESHEETS,
+    # In the static HTML, so that the browser fetches the default font
+    # before any script runs.
+    head_components=[
+        rx.el.link(
+            rel="preload",
+            href=style.font_preload(style.DEFAULT_FONT_FAMILY),
+            type="font/woff2",
+            cross_origin="anonymous",
+            custom_attrs={"as": "font"},
+        ),
+        rx.el.link(rel="stylesheet", href=style.font_stylesheet(style.DEFAULT_FONT_FAMILY)),
+    ],
+    style={"font_family": "var(--font-family)"},
+    # Serves /metrics, and the prebuilt frontend if any, next to the Reflex backend routes.
+    api_transformer=api_transformers(),
+)
+app.register_lifespan_task(http_client_lifespan)
+app.register_lifespan_task(process_pool_lifespan)
+app.register_lifespan_task(stale_sessions_lifespan(rx.get_upload_dir()))
 # app.backend_exception_handler(custom_backend_handler)
 
 # app.add_page(